@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_loyaltyconfiguration_promotionalbanner'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['email'], name='accounts_us_email_74c8d6_idx'),
+        ),
+    ]
@@ -28,6 +28,11 @@ class User(AbstractUser):
     
     def __str__(self):
         return f"{self.username} ({self.get_user_type_display()})"
+    
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['email']),
+        ]
 
 class OTPVerification(models.Model):
     OTP_TYPES = [
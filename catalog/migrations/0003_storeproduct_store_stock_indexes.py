@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-17 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_productimage_is_active_alter_product_image'),
+        ('stores', '0010_staff_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='storeproduct',
+            index=models.Index(fields=['store', 'stock_quantity'], name='catalog_sto_store_i_494160_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storeproduct',
+            index=models.Index(fields=['store', 'is_available'], name='catalog_sto_store_i_9c409e_idx'),
+        ),
+    ]
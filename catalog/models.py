@@ -1,11 +1,15 @@
 from django.db import models
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 from core.models import TimeStampedModel
-from stores.models import Store
+from stores.models import Store, STORE_DASHBOARD_STATS_CACHE_KEY
 import uuid
 
+# Cached row count for the paginated store products listing
+STORE_PRODUCT_COUNT_CACHE_KEY = 'store:{store_id}:sp_count'
+
 User = get_user_model()
 
 class Category(TimeStampedModel):
@@ -162,6 +166,24 @@ class StoreProduct(TimeStampedModel):
     def __str__(self):
         return f"{self.store.name} - {self.product.name}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.clear_store_caches(self.store_id)
+    
+    def delete(self, *args, **kwargs):
+        store_id = self.store_id
+        result = super().delete(*args, **kwargs)
+        self.clear_store_caches(store_id)
+        return result
+    
+    @staticmethod
+    def clear_store_caches(store_id):
+        """Drop the store's cached product counts"""
+        cache.delete_many([
+            STORE_DASHBOARD_STATS_CACHE_KEY.format(store_id=store_id),
+            STORE_PRODUCT_COUNT_CACHE_KEY.format(store_id=store_id),
+        ])
+    
     @property
     def is_low_stock(self):
         return self.stock_quantity <= self.low_stock_threshold
@@ -178,6 +200,8 @@ class StoreProduct(TimeStampedModel):
         indexes = [
             models.Index(fields=['store', 'availability_status', 'is_available']),
             models.Index(fields=['is_featured', 'is_available']),
+            models.Index(fields=['store', 'stock_quantity']),
+            models.Index(fields=['store', 'is_available']),
         ]
 
 class Ingredient(TimeStampedModel):
@@ -292,12 +292,12 @@ class InventorySyncService:
         from stores.models import StoreZipCoverage
         
         store1_zips = set(
-            StoreZipCoverage.objects.filter(store=store1, is_active=True)
+            StoreZipCoverage.objects.active_for(store1)
             .values_list('zip_area__zip_code', flat=True)
         )
         
         store2_zips = set(
-            StoreZipCoverage.objects.filter(store=store2, is_active=True)
+            StoreZipCoverage.objects.active_for(store2)
             .values_list('zip_area__zip_code', flat=True)
         )
         
@@ -8,7 +8,7 @@ from django.views.generic import TemplateView
 from django.db.models import Count, Sum, Q, F
 from django.utils import timezone
 from datetime import timedelta
-from .decorators import AdminRequiredMixin, StoreRequiredMixin, DeliveryAgentRequiredMixin
+from .decorators import AdminRequiredMixin, StoreRequiredMixin, DeliveryAgentRequiredMixin, get_user_store
 
 @login_required
 def dashboard_router(request):
@@ -135,12 +135,8 @@ class StoreDashboardView(StoreRequiredMixin, TemplateView):
         user = self.request.user
         
         # Get user's store
-        from stores.models import Store
         try:
-            if user.user_type == 'store_owner':
-                store = user.owned_stores.first()
-            else:  # store_staff
-                store = user.store_staff.first().store if hasattr(user, 'store_staff') else None
+            store = get_user_store(self.request)
             
             if not store:
                 return context
@@ -0,0 +1,14 @@
+"""
+Date helpers
+"""
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+
+
+def day_bounds(day):
+    """
+    [start, end) datetimes of a calendar day, so date filters stay a range on
+    created_at that the (store, -created_at) indexes can serve, unlike __date
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
@@ -1,20 +1,105 @@
-from django.http import Http404
+from django.http import Http404, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
-from functools import wraps
+from django.core.cache import cache
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from functools import partial, wraps
 
-def store_required(view_func):
+def _user_stores(user):
     """
-    Decorator that ensures only store owners and store staff can access the view
+    Stores owned by or employing the user, an owned store first. Staff membership
+    is an id__in subquery so the OR needs no join
     """
+    from stores.models import Store, StoreStaff
+    
+    staffed_stores = StoreStaff.objects.filter(user=user).values('store_id')
+    return Store.objects.filter(Q(owner=user) | Q(id__in=staffed_stores)).annotate(
+        is_owner=ExpressionWrapper(Q(owner=user), output_field=BooleanField())
+    ).order_by('-is_owner', 'name')
+
+def _resolve_user_store(user, fields=None):
+    """
+    Store owned by or employing the user, or None; an owned store wins over a
+    staffed one. One query for either role. With fields, only those columns are
+    loaded; fields=['id'] (the polling endpoints) reads the id from a short per-user
+    cache and runs no query at all while it is warm
+    """
+    from stores.models import Store, USER_STORE_ID_CACHE_KEY, USER_STORE_ID_CACHE_TIMEOUT
+    
+    if fields and set(fields) == {'id'}:
+        cache_key = USER_STORE_ID_CACHE_KEY.format(user_id=user.id)
+        store_id = cache.get(cache_key)
+        if store_id is None:
+            store_id = _user_stores(user).values_list('id', flat=True).first() or 0  # 0 caches "no store"
+            cache.set(cache_key, store_id, USER_STORE_ID_CACHE_TIMEOUT)
+        # Same deferred instance .only('id') would load
+        return Store.from_db(Store.objects.db, ['id'], [store_id]) if store_id else None
+    
+    stores = _user_stores(user)
+    if fields:
+        stores = stores.only(*fields)
+    return stores.first()
+
+def get_user_store(request, fields=None):
+    """
+    The request user's store (or None), resolved once per request and kept on request.store.
+    fields narrows the row for views that read only a few store columns
+    """
+    if not hasattr(request, 'store'):
+        request.store = _resolve_user_store(request.user, fields)
+    return request.store
+
+def store_required(view_func=None, *, fields=None):
+    """
+    Decorator that ensures only store owners and store staff can access the view.
+    The user's store (None if they have none) is resolved once and set on request.store;
+    use @store_required(fields=[...]) to load only the store columns the view reads
+    """
+    if view_func is None:
+        return partial(store_required, fields=fields)
+    
     @wraps(view_func)
     @login_required
     def _wrapped_view(request, *args, **kwargs):
         if request.user.user_type not in ['store_owner', 'store_staff']:
             return redirect('core:home')
+        get_user_store(request, fields)
         return view_func(request, *args, **kwargs)
     return _wrapped_view
 
+def get_owned_store(request, fields=None):
+    """
+    The request user's store when they own it, else None. get_user_store prefers an
+    owned store, so this is request.store with an ownership check
+    """
+    if fields:
+        fields = {*fields, 'owner_id'}
+    store = get_user_store(request, fields)
+    if store is None or store.owner_id != request.user.id:
+        return None
+    return store
+
+def store_owner_required(view_func=None, *, ajax=False):
+    """
+    Decorator that passes the user's active owned store to the view as its second
+    argument. A user without one is redirected home, or given an access-denied JSON
+    reply with ajax=True. The store comes from get_user_store, so it is resolved once
+    per request and kept on request.store
+    """
+    if view_func is None:
+        return partial(store_owner_required, ajax=ajax)
+    
+    @wraps(view_func)
+    @login_required
+    def _wrapped_view(request, *args, **kwargs):
+        store = get_owned_store(request)
+        if store is None or not store.is_active:
+            if ajax:
+                return JsonResponse({'success': False, 'message': 'Access denied'})
+            return redirect('core:home')
+        return view_func(request, store, *args, **kwargs)
+    return _wrapped_view
+
 def delivery_agent_required(view_func):
     """
     Decorator that ensures only delivery agents can access the view
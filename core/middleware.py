@@ -1,8 +1,24 @@
 from django.utils.deprecation import MiddlewareMixin
+from django.contrib.sessions.middleware import SessionMiddleware
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.db import connection
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
+# JSON endpoints polled by the store dashboards; they never change the session
+POLL_ENDPOINTS = {'stores:new_orders_count', 'stores:order_analytics'}
+
+# Per-view query ceilings checked by QueryBudgetMiddleware (cold cache, session and auth included)
+QUERY_BUDGETS = {
+    'stores:dashboard': 14,
+    'stores:delivery_agents': 7,
+    'stores:inventory_management': 9,
+    'stores:legacy_order_detail': 8,
+}
+
 class ZipCodeMiddleware(MiddlewareMixin):
     """Middleware to handle ZIP code sessions and redirects"""
     
@@ -58,3 +74,40 @@ class SecurityHeadersMiddleware(MiddlewareMixin):
         response['Referrer-Policy'] = 'strict-origin-when-cross-origin'
         
         return response
+
+class PollAwareSessionMiddleware(SessionMiddleware):
+    """Session middleware that skips the session write-back and cookie refresh for polling endpoints"""
+    
+    def process_response(self, request, response):
+        # SESSION_SAVE_EVERY_REQUEST would otherwise UPDATE the session row on every poll
+        match = getattr(request, 'resolver_match', None)
+        session = getattr(request, 'session', None)
+        if match and match.view_name in POLL_ENDPOINTS and session is not None and not session.modified:
+            return response
+        return super().process_response(request, response)
+
+class QueryBudgetMiddleware:
+    """
+    Development guard that logs a warning when a view runs more queries than its
+    QUERY_BUDGETS entry, so a template change that brings back an N+1 shows up in the log
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        query_count = 0
+        
+        def count_query(execute, sql, params, many, context):
+            nonlocal query_count
+            query_count += 1
+            return execute(sql, params, many, context)
+        
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        
+        match = getattr(request, 'resolver_match', None)
+        budget = QUERY_BUDGETS.get(match.view_name) if match else None
+        if budget is not None and query_count > budget:
+            logger.warning(f"{match.view_name} ran {query_count} queries (budget {budget}) for {request.path}")
+        return response
@@ -0,0 +1,51 @@
+"""
+Pagination helpers
+"""
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+
+class PkPaginator(Paginator):
+    """
+    Paginator that slices primary keys first and then loads only the rows for
+    the requested page, so deep OFFSETs scan a narrow pk index instead of wide
+    joined rows. The queryset's select_related/prefetch_related still apply to
+    the page itself.
+    """
+    
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        
+        page_pks = list(self.object_list.values_list('pk', flat=True)[bottom:top])
+        objects = {obj.pk: obj for obj in self.object_list.filter(pk__in=page_pks)}
+        
+        # Keep the order of the pk slice (ties in the sort key could otherwise shuffle)
+        return self._get_page([objects[pk] for pk in page_pks if pk in objects], number, self)
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator whose total count is cached, so paging through a large listing
+    does not repeat a full COUNT on every request. Without a count_cache_key
+    it behaves like the stock Paginator.
+    """
+    
+    def __init__(self, *args, count_cache_key=None, count_timeout=300, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_cache_key = count_cache_key
+        self.count_timeout = count_timeout
+    
+    @cached_property
+    def count(self):
+        if self.count_cache_key is None:
+            return super().count
+        return cache.get_or_set(
+            self.count_cache_key,
+            lambda: self.object_list.values('pk').count(),
+            self.count_timeout
+        )
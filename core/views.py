@@ -142,28 +142,24 @@ class HomeView(TemplateView):
         2. Currently open stores
         3. Store with best delivery time/rating (can be enhanced)
         """
-        available_stores = Store.objects.filter(
+        # Status, closure requests and today's business hours are all filtered in SQL
+        available_stores = Store.objects.open_now().filter(
             zip_coverages__zip_area=zip_area,
             zip_coverages__is_active=True,
-            is_active=True,
-            status='open'
-        ).select_related().order_by('name')  # Can add ordering by rating, delivery time, etc.
+            is_active=True
+        ).order_by('name')  # Can add ordering by rating, delivery time, etc.
         
         # Return the first available store (can be enhanced with better logic)
-        for store in available_stores:
-            if store.is_open:  # Uses the is_open property that checks business hours
-                return store
-        
-        return None
+        return available_stores.first()
     
     def get_delivery_info(self, store, zip_area):
         """Get delivery information for the store-ZIP combination"""
         try:
             coverage = StoreZipCoverage.objects.get(store=store, zip_area=zip_area)
             return {
-                'delivery_fee': coverage.get_delivery_fee(),
-                'min_order_value': coverage.get_min_order_value(),
-                'delivery_time': coverage.get_delivery_time(),
+                'delivery_fee': coverage.get_delivery_fee(zip_area),
+                'min_order_value': coverage.get_min_order_value(zip_area),
+                'delivery_time': coverage.get_delivery_time(zip_area),
             }
         except StoreZipCoverage.DoesNotExist:
             return None
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0002_deliveryagentzipcoverage'),
+        ('locations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deliveryagentzipcoverage',
+            index=models.Index(fields=['zip_area', 'is_active'], name='delivery_de_zip_are_2f8cb6_idx'),
+        ),
+    ]
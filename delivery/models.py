@@ -1,14 +1,20 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from decimal import Decimal
 from core.models import TimeStampedModel
 from stores.models import Store
 from orders.models import Order
 from locations.models import ZipArea
+import time
 import uuid
 
 User = get_user_model()
 
+AVAILABLE_DELIVERY_AGENTS_CACHE_KEY = 'available_delivery_agents'
+# Stamp that changes on every agent write; keys cached agent template fragments
+DELIVERY_AGENTS_VERSION_CACHE_KEY = 'delivery_agents_version'
+
 class DeliveryAgent(TimeStampedModel):
     """Delivery agents for stores"""
     AGENT_STATUS = [
@@ -83,6 +89,29 @@ class DeliveryAgent(TimeStampedModel):
             self.current_orders_count < self.max_concurrent_orders
         )
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete_many([AVAILABLE_DELIVERY_AGENTS_CACHE_KEY, DELIVERY_AGENTS_VERSION_CACHE_KEY])
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        cache.delete_many([AVAILABLE_DELIVERY_AGENTS_CACHE_KEY, DELIVERY_AGENTS_VERSION_CACHE_KEY])
+        return result
+    
+    @classmethod
+    def get_cache_version(cls):
+        """Current agents version stamp; a fresh one is issued after any agent write"""
+        return cache.get_or_set(DELIVERY_AGENTS_VERSION_CACHE_KEY, time.time_ns, timeout=None)
+    
+    @classmethod
+    def get_available_agents(cls):
+        """Active, available agents (id, agent_id and name only), cached briefly for assignment dropdowns"""
+        def load_agents():
+            return list(cls.objects.filter(status='active', is_available=True).select_related('user').only(
+                'agent_id', 'user__first_name', 'user__last_name'
+            ))
+        return cache.get_or_set(AVAILABLE_DELIVERY_AGENTS_CACHE_KEY, load_agents, timeout=30)
+    
     class Meta:
         unique_together = ['store', 'agent_id']
 
@@ -236,3 +265,6 @@ class DeliveryAgentZipCoverage(TimeStampedModel):
     class Meta:
         unique_together = ['agent', 'zip_area']
         ordering = ['zip_area__zip_code']
+        indexes = [
+            models.Index(fields=['zip_area', 'is_active']),
+        ]
@@ -189,6 +189,10 @@ TWILIO_FROM_NUMBER=+1234567890
 # Redis (optional)
 REDIS_URL=redis://localhost:6379/1
 
+# Celery broker (optional): set only together with the meat-seafood-celery worker,
+# otherwise background tasks run inline in the web process
+# CELERY_BROKER_URL=redis://localhost:6379/2
+
 # Use SQLite (for smaller deployments)
 USE_SQLITE=False
 """
@@ -295,6 +299,36 @@ WantedBy=multi-user.target
     
     logger.info("Created systemd service template")
 
+def create_celery_service():
+    """Create systemd service file for the Celery worker"""
+    logger.info("Creating Celery worker service template...")
+    
+    service_content = """
+[Unit]
+Description=Meat & Seafood Platform Celery Worker
+After=network.target redis.service
+
+[Service]
+Type=simple
+User=www-data
+Group=www-data
+WorkingDirectory=/path/to/your/project
+ExecStart=/path/to/your/venv/bin/celery -A meat_seafood worker --loglevel=info --concurrency=2
+Restart=on-failure
+RestartSec=5s
+
+Environment=DJANGO_SETTINGS_MODULE=meat_seafood.settings_production
+
+[Install]
+WantedBy=multi-user.target
+"""
+    
+    service_file = Path('meat-seafood-celery.service')
+    with open(service_file, 'w') as f:
+        f.write(service_content.strip())
+    
+    logger.info("Created Celery worker service template")
+
 def create_deployment_checklist():
     """Create deployment checklist"""
     logger.info("Creating deployment checklist...")
@@ -318,6 +352,7 @@ def create_deployment_checklist():
 - [ ] Enable Nginx site: sudo ln -s /etc/nginx/sites-available/meat-seafood /etc/nginx/sites-enabled/
 - [ ] Copy systemd service: sudo cp meat-seafood.service /etc/systemd/system/
 - [ ] Start services: sudo systemctl start meat-seafood && sudo systemctl enable meat-seafood
+- [ ] If CELERY_BROKER_URL is set: sudo cp meat-seafood-celery.service /etc/systemd/system/ && sudo systemctl start meat-seafood-celery && sudo systemctl enable meat-seafood-celery
 - [ ] Reload Nginx: sudo nginx -t && sudo systemctl reload nginx
 
 ## Post-deployment:
@@ -374,6 +409,7 @@ def main():
         create_environment_file()
         create_nginx_config()
         create_systemd_service()
+        create_celery_service()
         create_deployment_checklist()
         
         logger.info("Deployment completed successfully!")
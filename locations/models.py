@@ -1,7 +1,10 @@
 from django.db import models
+from django.core.cache import cache
 from decimal import Decimal
 from core.models import TimeStampedModel
 
+ACTIVE_ZIP_AREA_CHOICES_CACHE_KEY = 'active_zip_area_choices'
+
 class ZipArea(TimeStampedModel):
     """ZIP code areas for delivery coverage"""
     zip_code = models.CharField(max_length=10, unique=True, db_index=True)
@@ -23,6 +26,27 @@ class ZipArea(TimeStampedModel):
     def __str__(self):
         return f"{self.zip_code} - {self.city}, {self.state}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete(ACTIVE_ZIP_AREA_CHOICES_CACHE_KEY)
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        cache.delete(ACTIVE_ZIP_AREA_CHOICES_CACHE_KEY)
+        return result
+    
+    @classmethod
+    def get_active_choices(cls):
+        """Cached (id, label) pairs for all active ZIP areas, for form choices"""
+        def load_choices():
+            return [
+                (zip_area_id, f"{zip_code} - {city}, {state}")
+                for zip_area_id, zip_code, city, state in cls.objects.filter(
+                    is_active=True
+                ).values_list('id', 'zip_code', 'city', 'state')
+            ]
+        return cache.get_or_set(ACTIVE_ZIP_AREA_CHOICES_CACHE_KEY, load_choices, timeout=300)
+    
     class Meta:
         ordering = ['state', 'city', 'zip_code']
         indexes = [
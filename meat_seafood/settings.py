@@ -46,7 +46,7 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.PollAwareSessionMiddleware',  # Session middleware that skips write-back on polling endpoints
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'core.csrf_middleware.CustomCSRFMiddleware',
@@ -57,6 +57,10 @@ MIDDLEWARE = [
     'core.middleware.ZipCodeMiddleware',
 ]
 
+if DEBUG:
+    # Warn about views that exceed their query budget (outermost, so every query is counted)
+    MIDDLEWARE.insert(0, 'core.middleware.QueryBudgetMiddleware')
+
 ROOT_URLCONF = 'meat_seafood.urls'
 
 TEMPLATES = [
@@ -210,6 +214,13 @@ if not DEBUG and config('USE_REDIS', default=False, cast=bool):
         # Keep in-memory as fallback
         pass
 
+# Celery Configuration - Run tasks inline unless a broker is explicitly configured
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=REDIS_URL)
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=True, cast=bool)
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+
 # Email Configuration
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 07:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0001_initial'),
+        ('orders', '0005_order_customer_delivery_confirmed_and_more'),
+        ('stores', '0009_closure_active_partial_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['store', '-created_at'], name='orders_orde_store_i_6d7de7_idx'),
+        ),
+    ]
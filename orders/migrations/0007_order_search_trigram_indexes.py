@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# (index name, table, column) for the columns searched by the store order list
+TRIGRAM_INDEXES = [
+    ('orders_order_number_trgm', 'orders_order', 'order_number'),
+    ('accounts_user_email_trgm', 'accounts_user', 'email'),
+    ('accounts_user_first_name_trgm', 'accounts_user', 'first_name'),
+    ('accounts_user_last_name_trgm', 'accounts_user', 'last_name'),
+    ('accounts_user_phone_number_trgm', 'accounts_user', 'phone_number'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Index UPPER(column) with pg_trgm so Django's icontains (UPPER(col::text) LIKE ...) can use it"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" '
+            f'USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_user_email_index'),
+        ('orders', '0006_order_store_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
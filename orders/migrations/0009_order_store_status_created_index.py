@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 07:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0001_initial'),
+        ('orders', '0008_order_store_created_id_index'),
+        ('stores', '0010_staff_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='orders_orde_store_i_610c63_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['store', 'status', '-created_at'], name='orders_orde_store_i_510e34_idx'),
+        ),
+    ]
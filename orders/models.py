@@ -1,8 +1,9 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from decimal import Decimal
 from core.models import TimeStampedModel
-from stores.models import Store, DeliverySlot
+from stores.models import Store, DeliverySlot, STORE_DASHBOARD_STATS_CACHE_KEY
 from catalog.models import StoreProduct
 from locations.models import Address
 import uuid
@@ -11,6 +12,32 @@ import string
 
 User = get_user_model()
 
+# Cached per-store order figures; cleared whenever one of the store's orders changes
+STORE_ORDER_DASHBOARD_CACHE_KEY = 'store_dash:{store_id}'
+STORE_ORDER_KPIS_CACHE_KEY = 'store_kpis:{store_id}'
+STORE_NEW_ORDERS_CACHE_KEY = 'store_new_orders:{store_id}'
+
+# Statuses whose Order.save() has side effects (confirmation/handover codes, agent auto-assignment);
+# other status changes can be written with a single-column update()
+ORDER_SAVE_HOOK_STATUSES = {'placed', 'confirmed', 'packed'}
+
+# New orders still waiting on the store, shown as "pending" on the store dashboards
+PENDING_ORDER_STATUSES = ('placed', 'confirmed')
+
+# Columns a status change through Order.save() can touch
+ORDER_STATUS_UPDATE_FIELDS = ['status', 'updated_at', 'delivery_confirmation_code', 'handover_code']
+
+
+def clear_store_order_caches(store_id):
+    """Drop every cached order figure for a store"""
+    cache.delete_many([
+        key.format(store_id=store_id)
+        for key in (
+            STORE_ORDER_DASHBOARD_CACHE_KEY, STORE_ORDER_KPIS_CACHE_KEY,
+            STORE_NEW_ORDERS_CACHE_KEY, STORE_DASHBOARD_STATS_CACHE_KEY,
+        )
+    ])
+
 class Cart(TimeStampedModel):
     """Shopping cart (one per store per user)"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='carts')
@@ -182,6 +209,7 @@ class Order(TimeStampedModel):
                 self.handover_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
         
         super().save(*args, **kwargs)
+        clear_store_order_caches(self.store_id)
         
         # Auto-assign delivery agent when order is confirmed
         if self.status == 'confirmed' and old_status != 'confirmed':
@@ -194,6 +222,10 @@ class Order(TimeStampedModel):
                 logger = logging.getLogger(__name__)
                 logger.error(f"Failed to auto-assign delivery agent for order {self.order_number}: {str(e)}")
 
+    def delete(self, *args, **kwargs):
+        clear_store_order_caches(self.store_id)
+        return super().delete(*args, **kwargs)
+
     def _generate_unique_order_number(self):
         """
         Generate a unique order number with format: ORD-USERID-YYYYMMDD-HHMMSS-XXX
@@ -352,7 +384,8 @@ class Order(TimeStampedModel):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', 'status']),
-            models.Index(fields=['store', 'status']),
+            models.Index(fields=['store', 'status', '-created_at']),
+            models.Index(fields=['store', '-created_at', '-id']),
             models.Index(fields=['order_number']),
             models.Index(fields=['status', 'created_at']),
         ]
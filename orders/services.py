@@ -10,6 +10,7 @@ This module provides comprehensive order management functionality including:
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.db.models import Count, Sum
 from .models import Order, OrderStatusHistory
 import logging
 
@@ -287,9 +288,18 @@ class OrderAnalyticsService:
         if date_to:
             queryset = queryset.filter(created_at__lte=date_to)
         
+        # Totals, then one grouped query per breakdown instead of a COUNT per status
+        totals = queryset.aggregate(total_orders=Count('id'), total_revenue=Sum('total_amount'))
+        status_counts = dict(
+            queryset.order_by().values_list('status').annotate(count=Count('id'))
+        )
+        payment_counts = dict(
+            queryset.order_by().values_list('payment_status').annotate(count=Count('id'))
+        )
+        
         stats = {
-            'total_orders': queryset.count(),
-            'total_revenue': sum(order.total_amount for order in queryset),
+            'total_orders': totals['total_orders'],
+            'total_revenue': totals['total_revenue'] or 0,
             'status_breakdown': {},
             'payment_status_breakdown': {},
             'average_order_value': 0,
@@ -297,16 +307,14 @@ class OrderAnalyticsService:
         
         # Calculate status breakdown
         for status_code, status_name in Order.ORDER_STATUS:
-            count = queryset.filter(status=status_code).count()
             stats['status_breakdown'][status_code] = {
                 'name': status_name,
-                'count': count
+                'count': status_counts.get(status_code, 0)
             }
         
         # Calculate payment status breakdown
         for payment_status in ['pending', 'paid', 'failed', 'refunded']:
-            count = queryset.filter(payment_status=payment_status).count()
-            stats['payment_status_breakdown'][payment_status] = count
+            stats['payment_status_breakdown'][payment_status] = payment_counts.get(payment_status, 0)
         
         # Calculate average order value
         if stats['total_orders'] > 0:
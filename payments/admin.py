@@ -7,9 +7,17 @@ class PaymentMethodAdmin(admin.ModelAdmin):
     list_filter = ['payment_type', 'is_default', 'is_active', 'created_at']
     search_fields = ['user__username', 'user__email', 'upi_id', 'card_holder_name']
     readonly_fields = ['created_at', 'updated_at']
+    actions = ['make_default']
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user')
+    
+    @admin.action(description='Make the selected method its user\'s default')
+    def make_default(self, request, queryset):
+        # Editing is_default directly is rejected while another default exists;
+        # this clears the user's old default first
+        for method in queryset.only('id', 'user_id'):
+            method.make_default()
 
 @admin.register(UPIProvider)
 class UPIProviderAdmin(admin.ModelAdmin):
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 07:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def clear_duplicate_defaults(apps, schema_editor):
+    """Keep only the most recent default payment method per user"""
+    PaymentMethod = apps.get_model('payments', 'PaymentMethod')
+    seen_users = set()
+    for method in PaymentMethod.objects.filter(is_default=True).order_by('user_id', '-created_at', '-id'):
+        if method.user_id in seen_users:
+            PaymentMethod.objects.filter(pk=method.pk).update(is_default=False)
+        else:
+            seen_users.add(method.user_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_add_phonepe_gateway_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_defaults, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='paymentmethod',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('user',), name='one_default_payment_method_per_user'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.conf import settings
 # from orders.models import Order  # Will uncomment when ready
@@ -35,6 +35,13 @@ class PaymentMethod(models.Model):
     
     class Meta:
         ordering = ['-is_default', '-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(is_default=True),
+                name='one_default_payment_method_per_user'
+            ),
+        ]
     
     def __str__(self):
         if self.payment_type == 'upi':
@@ -44,6 +51,19 @@ class PaymentMethod(models.Model):
         elif self.payment_type == 'cod':
             return 'Cash on Delivery'
         return self.get_payment_type_display()
+    
+    def make_default(self):
+        """
+        Make this the user's only default method. The old default is cleared first:
+        the partial unique constraint is checked row by row, so both flags cannot
+        change in one UPDATE
+        """
+        with transaction.atomic():
+            PaymentMethod.objects.filter(user_id=self.user_id, is_default=True).exclude(
+                pk=self.pk
+            ).update(is_default=False)
+            PaymentMethod.objects.filter(pk=self.pk).update(is_default=True)
+        self.is_default = True
 
 # Payment model will be added once Order model is properly set up
 
@@ -5,10 +5,40 @@ Based on official PhonePe API documentation
 import requests
 import json
 from decimal import Decimal
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.conf import settings
 from django.utils import timezone
 from .models_advanced import PaymentGateway, PaymentTransaction
 
+# (connect, read) timeouts for PhonePe API calls; a slow handshake can no
+# longer consume the whole read budget
+PHONEPE_TIMEOUT = (3.05, 10)
+
+_phonepe_session = None
+
+
+def get_phonepe_session():
+    """Return the shared PhonePe HTTP session with pooled connections and retries"""
+    global _phonepe_session
+    if _phonepe_session is None:
+        # PhonePe de-duplicates on merchant transaction/order IDs, so POSTs are
+        # safe to retry on gateway errors
+        retry = Retry(
+            total=3,
+            connect=2,
+            read=1,
+            backoff_factor=0.3,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False
+        )
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(max_retries=retry))
+        session.mount('http://', HTTPAdapter(max_retries=retry))
+        _phonepe_session = session
+    return _phonepe_session
+
 
 class PhonePeProcessor:
     """PhonePe Payment Gateway Processor following official API"""
@@ -53,7 +83,7 @@ class PhonePeProcessor:
                 'grant_type': 'client_credentials'
             }
             
-            response = requests.post(self.auth_url, headers=headers, data=data, timeout=30)
+            response = get_phonepe_session().post(self.auth_url, headers=headers, data=data, timeout=PHONEPE_TIMEOUT)
             
             if response.status_code == 200:
                 token_data = response.json()
@@ -115,7 +145,7 @@ class PhonePeProcessor:
                 'Authorization': f'O-Bearer {auth_token}',
             }
             
-            response = requests.post(self.payment_url, headers=headers, json=payload, timeout=30)
+            response = get_phonepe_session().post(self.payment_url, headers=headers, json=payload, timeout=PHONEPE_TIMEOUT)
             
             if response.status_code == 200:
                 payment_data = response.json()
@@ -185,7 +215,7 @@ class PhonePeProcessor:
                 'Authorization': f'O-Bearer {auth_token}',
             }
             
-            response = requests.get(url, headers=headers, timeout=30)
+            response = get_phonepe_session().get(url, headers=headers, timeout=PHONEPE_TIMEOUT)
             
             if response.status_code == 200:
                 status_data = response.json()
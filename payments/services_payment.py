@@ -4,6 +4,7 @@ Handles multi-gateway payment processing, wallet integration, and UPI payments
 """
 import logging
 import json
+import binascii
 import uuid
 import hmac
 import hashlib
@@ -11,12 +12,13 @@ from decimal import Decimal
 from typing import Dict, List, Optional, Tuple
 from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import Count, Sum, Avg, Q
 from django.core.cache import cache
 from payments.models_advanced import (
     PaymentGateway, PaymentMethod, PaymentTransaction, PaymentWebhook
 )
+from payments.phonepe_processor import PHONEPE_TIMEOUT, get_phonepe_session
 
 logger = logging.getLogger(__name__)
 
@@ -616,11 +618,25 @@ class PhonePeProcessor(BaseGatewayProcessor):
         self.salt_key = self.config.get('salt_key')
         self.salt_index = self.config.get('salt_index', 1)
         self.base_url = self.config.get('base_url', 'https://api-preprod.phonepe.com/apis/pg-sandbox')
+        
+        # Endpoints and header template are fixed per gateway; build them once
+        self.pay_url = f"{self.base_url}/pg/v1/pay"
+        self.refund_url = f"{self.base_url}/pg/v1/refund"
+        self._headers_template = {'Content-Type': 'application/json'}
+    
+    def _encode_request(self, payload: Dict, api_path: str) -> Tuple[str, str]:
+        """Base64-encode a request payload and compute its X-VERIFY checksum"""
+        # b2a_base64 yields ASCII bytes directly, which are hashed without another encode
+        payload_b64 = binascii.b2a_base64(json.dumps(payload).encode(), newline=False)
+        digest = hashlib.sha256(payload_b64)
+        digest.update(f"{api_path}{self.salt_key}".encode())
+        
+        checksum = digest.hexdigest() + "###" + str(self.salt_index)
+        return payload_b64.decode('ascii'), checksum
     
     def create_payment(self, transaction: PaymentTransaction) -> Dict:
         """Create PhonePe payment"""
         try:
-            import base64
             import requests
             
             # Create transaction ID
@@ -641,27 +657,19 @@ class PhonePeProcessor(BaseGatewayProcessor):
                 }
             }
             
-            # Encode payload
-            payload_json = json.dumps(payload)
-            payload_b64 = base64.b64encode(payload_json.encode()).decode()
-            
-            # Create checksum
-            string_to_hash = f"{payload_b64}/pg/v1/pay{self.salt_key}"
-            checksum = hashlib.sha256(string_to_hash.encode()).hexdigest() + "###" + str(self.salt_index)
+            # Encode payload and create checksum
+            payload_b64, checksum = self._encode_request(payload, "/pg/v1/pay")
             
             # Prepare request headers
-            headers = {
-                'Content-Type': 'application/json',
-                'X-VERIFY': checksum
-            }
+            headers = self._headers_template.copy()
+            headers['X-VERIFY'] = checksum
             
             # Make API request
-            url = f"{self.base_url}/pg/v1/pay"
-            response = requests.post(
-                url,
+            response = get_phonepe_session().post(
+                self.pay_url,
                 json={"request": payload_b64},
                 headers=headers,
-                timeout=30
+                timeout=PHONEPE_TIMEOUT
             )
             
             response_data = response.json()
@@ -717,15 +725,13 @@ class PhonePeProcessor(BaseGatewayProcessor):
             checksum = hashlib.sha256(string_to_hash.encode()).hexdigest() + "###" + str(self.salt_index)
             
             # Prepare request headers
-            headers = {
-                'Content-Type': 'application/json',
-                'X-VERIFY': checksum,
-                'X-MERCHANT-ID': self.merchant_id
-            }
+            headers = self._headers_template.copy()
+            headers['X-VERIFY'] = checksum
+            headers['X-MERCHANT-ID'] = self.merchant_id
             
             # Make status check API request
             url = f"{self.base_url}/pg/v1/status/{self.merchant_id}/{merchant_transaction_id}"
-            status_response = requests.get(url, headers=headers, timeout=30)
+            status_response = get_phonepe_session().get(url, headers=headers, timeout=PHONEPE_TIMEOUT)
             status_data = status_response.json()
             
             if status_response.status_code == 200 and status_data.get('success'):
@@ -772,7 +778,6 @@ class PhonePeProcessor(BaseGatewayProcessor):
     def process_refund(self, original: PaymentTransaction, refund: PaymentTransaction) -> Dict:
         """Process PhonePe refund"""
         try:
-            import base64
             import requests
             
             # Create refund transaction ID
@@ -789,27 +794,19 @@ class PhonePeProcessor(BaseGatewayProcessor):
                 "callbackUrl": f"{settings.SITE_URL}/payments/phonepe/refund-webhook/"
             }
             
-            # Encode payload
-            payload_json = json.dumps(payload)
-            payload_b64 = base64.b64encode(payload_json.encode()).decode()
-            
-            # Create checksum
-            string_to_hash = f"{payload_b64}/pg/v1/refund{self.salt_key}"
-            checksum = hashlib.sha256(string_to_hash.encode()).hexdigest() + "###" + str(self.salt_index)
+            # Encode payload and create checksum
+            payload_b64, checksum = self._encode_request(payload, "/pg/v1/refund")
             
             # Prepare request headers
-            headers = {
-                'Content-Type': 'application/json',
-                'X-VERIFY': checksum
-            }
+            headers = self._headers_template.copy()
+            headers['X-VERIFY'] = checksum
             
             # Make refund API request
-            url = f"{self.base_url}/pg/v1/refund"
-            response = requests.post(
-                url,
+            response = get_phonepe_session().post(
+                self.refund_url,
                 json={"request": payload_b64},
                 headers=headers,
-                timeout=30
+                timeout=PHONEPE_TIMEOUT
             )
             
             response_data = response.json()
@@ -917,35 +914,27 @@ class GenericProcessor(BaseGatewayProcessor):
 class PaymentAnalyticsService:
     """Service for payment analytics and reporting"""
     
+    # Upper bound on concurrent per-gateway aggregate queries
+    ANALYTICS_MAX_WORKERS = 4
+    
     @staticmethod
-    def generate_daily_analytics(date=None):
-        """Generate daily payment analytics"""
-        if date is None:
-            date = timezone.now().date()
-        
-        from payments.models_advanced import PaymentAnalytics
-        from django.db.models import Count, Sum, Avg, Q
-        
-        # Process analytics for each gateway
-        for gateway in PaymentGateway.objects.filter(is_active=True):
+    def _collect_gateway_stats(gateway, date):
+        """Run the read-only aggregate queries for one gateway on one day"""
+        try:
             transactions = PaymentTransaction.objects.filter(
                 gateway=gateway,
                 initiated_at__date=date
             )
             
-            total_count = transactions.count()
-            successful_count = transactions.filter(status='success').count()
-            failed_count = transactions.filter(status='failed').count()
-            
-            # Calculate amounts
-            amounts = transactions.filter(status='success').aggregate(
-                total_amount=Sum('amount'),
-                total_fees=Sum('gateway_fee')
+            # Counts and successful amounts in one pass using filtered aggregates
+            totals = transactions.aggregate(
+                total_count=Count('id'),
+                successful_count=Count('id', filter=Q(status='success')),
+                failed_count=Count('id', filter=Q(status='failed')),
+                total_amount=Sum('amount', filter=Q(status='success')),
+                total_fees=Sum('gateway_fee', filter=Q(status='success'))
             )
             
-            total_amount = amounts['total_amount'] or Decimal('0.00')
-            total_fees = amounts['total_fees'] or Decimal('0.00')
-            
             # Payment method breakdown
             payment_methods = transactions.values('payment_method__payment_type').annotate(
                 count=Count('id')
@@ -955,17 +944,54 @@ class PaymentAnalyticsService:
             for pm in payment_methods:
                 method_counts[pm['payment_method__payment_type']] = pm['count']
             
+            return {
+                'total_count': totals['total_count'],
+                'successful_count': totals['successful_count'],
+                'failed_count': totals['failed_count'],
+                'total_amount': totals['total_amount'] or Decimal('0.00'),
+                'total_fees': totals['total_fees'] or Decimal('0.00'),
+                'method_counts': method_counts,
+            }
+        finally:
+            # Worker threads open their own connection; release it when done
+            connection.close()
+    
+    @staticmethod
+    def generate_daily_analytics(date=None):
+        """Generate daily payment analytics"""
+        if date is None:
+            date = timezone.now().date()
+        
+        from concurrent.futures import ThreadPoolExecutor
+        from payments.models_advanced import PaymentAnalytics
+        
+        gateways = list(PaymentGateway.objects.filter(is_active=True))
+        if not gateways:
+            return
+        
+        # Per-gateway reads are independent, so overlap them on a bounded pool
+        max_workers = min(PaymentAnalyticsService.ANALYTICS_MAX_WORKERS, len(gateways))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            all_stats = list(pool.map(
+                lambda gateway: PaymentAnalyticsService._collect_gateway_stats(gateway, date),
+                gateways
+            ))
+        
+        # Writes stay on the calling thread
+        for gateway, stats in zip(gateways, all_stats):
+            method_counts = stats['method_counts']
+            
             # Create or update analytics record
             analytics, created = PaymentAnalytics.objects.update_or_create(
                 date=date,
                 gateway=gateway,
                 defaults={
-                    'total_transactions': total_count,
-                    'successful_transactions': successful_count,
-                    'failed_transactions': failed_count,
-                    'total_amount': total_amount,
-                    'successful_amount': total_amount,
-                    'total_fees': total_fees,
+                    'total_transactions': stats['total_count'],
+                    'successful_transactions': stats['successful_count'],
+                    'failed_transactions': stats['failed_count'],
+                    'total_amount': stats['total_amount'],
+                    'successful_amount': stats['total_amount'],
+                    'total_fees': stats['total_fees'],
                     'card_transactions': method_counts.get('card', 0),
                     'upi_transactions': method_counts.get('upi', 0),
                     'wallet_transactions': method_counts.get('wallet', 0),
@@ -1004,24 +1030,39 @@ class PaymentAnalyticsService:
     def detect_fraud_patterns():
         """Detect potential fraud patterns in payments"""
         from datetime import timedelta
+        from django.db.models import F, Window
         
         cutoff_time = timezone.now() - timedelta(hours=1)
+        high_value_threshold = Decimal('10000.00')
         
-        # Multiple failed attempts from same user
-        suspicious_users = PaymentTransaction.objects.filter(
-            initiated_at__gte=cutoff_time,
-            status='failed'
-        ).values('user').annotate(
-            failed_count=Count('id')
-        ).filter(failed_count__gte=5)
-        
-        # High-value transactions
-        high_value_transactions = PaymentTransaction.objects.filter(
-            initiated_at__gte=cutoff_time,
-            amount__gte=Decimal('10000.00')
+        # One pass over the last hour: a window count gives each row its user's
+        # failed attempts, and only the columns the report needs are selected
+        flagged = PaymentTransaction.objects.filter(
+            initiated_at__gte=cutoff_time
+        ).annotate(
+            user_failed_count=Window(
+                expression=Count('id', filter=Q(status='failed')),
+                partition_by=[F('user')]
+            )
+        ).filter(
+            Q(amount__gte=high_value_threshold) | Q(user_failed_count__gte=5)
+        ).order_by().values(
+            'id', 'transaction_id', 'user_id', 'amount', 'status', 'initiated_at', 'user_failed_count'
         )
         
+        suspicious_users = {}
+        high_value_transactions = []
+        for row in flagged:
+            failed_count = row.pop('user_failed_count')
+            if failed_count >= 5:
+                suspicious_users[row['user_id']] = failed_count
+            if row['amount'] >= high_value_threshold:
+                high_value_transactions.append(row)
+        
         return {
-            'suspicious_users': list(suspicious_users),
-            'high_value_transactions': list(high_value_transactions.values())
+            'suspicious_users': [
+                {'user': user_id, 'failed_count': failed_count}
+                for user_id, failed_count in suspicious_users.items()
+            ],
+            'high_value_transactions': high_value_transactions
         }
@@ -0,0 +1,69 @@
+"""
+Payment Background Tasks
+Applies verified gateway webhook state changes off the request path
+"""
+import logging
+from celery import shared_task
+from payments.models_advanced import PaymentTransaction
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(acks_late=False, ignore_result=True)
+def apply_phonepe_webhook(webhook_data):
+    """Apply a verified PhonePe payment webhook to its transaction and order"""
+    response_data = webhook_data.get('response', {})
+    merchant_transaction_id = response_data.get('merchantTransactionId')
+    if not merchant_transaction_id:
+        return
+    
+    original_transaction_id = merchant_transaction_id.removeprefix('MT')
+    
+    try:
+        transaction = PaymentTransaction.objects.select_related('order').get(
+            transaction_id=original_transaction_id
+        )
+    except PaymentTransaction.DoesNotExist:
+        logger.error(f"Transaction not found in webhook: {merchant_transaction_id}")
+        return
+    
+    # The status change is claimed with a conditional UPDATE, so of several concurrent
+    # or repeated deliveries of the same state only the one that moved the row runs
+    # the order workflow; a custom task id alone does not deduplicate in Celery
+    state = response_data.get('state')
+    unclaimed = PaymentTransaction.objects.filter(pk=transaction.pk)
+    if state == 'COMPLETED':
+        claimed = unclaimed.exclude(status='success').update(
+            status='success',
+            gateway_response=webhook_data
+        )
+        if not claimed:
+            return
+        
+        # Use OrderWorkflowService for payment success
+        from orders.services import OrderWorkflowService
+        if transaction.order:
+            OrderWorkflowService.handle_payment_success(
+                order=transaction.order,
+                payment_details=webhook_data
+            )
+        
+        logger.info(f"Payment successful via webhook: {merchant_transaction_id}")
+    
+    elif state == 'FAILED':
+        claimed = unclaimed.exclude(status__in=['failed', 'cancelled']).update(
+            status='failed',
+            gateway_response=webhook_data
+        )
+        if not claimed:
+            return
+        
+        # Use OrderWorkflowService for payment failure
+        from orders.services import OrderWorkflowService
+        if transaction.order:
+            OrderWorkflowService.handle_payment_failure(
+                order=transaction.order,
+                error_details=webhook_data
+            )
+        
+        logger.warning(f"Payment failed via webhook: {merchant_transaction_id}")
@@ -68,13 +68,8 @@ def delete_payment_method(request, method_id):
 @login_required
 def set_default_payment_method(request, method_id):
     """Set a payment method as default"""
-    # Remove default from all methods
-    PaymentMethod.objects.filter(user=request.user).update(is_default=False)
-    
-    # Set new default
-    method = get_object_or_404(PaymentMethod, id=method_id, user=request.user)
-    method.is_default = True
-    method.save()
+    method = get_object_or_404(PaymentMethod.objects.only('id', 'user_id'), id=method_id, user=request.user)
+    method.make_default()
     return redirect('payments:payment_methods')
 
 def payment_options_checkout(request):
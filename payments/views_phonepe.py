@@ -5,18 +5,38 @@ Handles PhonePe callbacks, webhooks, and payment processing
 import json
 import base64
 import hashlib
+import hmac
 import logging
 from django.shortcuts import render, redirect
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods, require_POST
+from django.views.decorators.cache import cache_control
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from payments.models_advanced import PaymentTransaction, PaymentGateway
 from payments.services_payment import PaymentProcessor
+from payments.tasks import apply_phonepe_webhook
+
+# Import orjson only if available; webhook parsing falls back to the stdlib
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# Pre-encoded acknowledgement body for webhook responses
+WEBHOOK_ACK_BODY = b"OK"
+
+
+def _parse_webhook_body(body: bytes) -> dict:
+    """Parse a webhook request body, preferring orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(body)
+    return json.loads(body)
+
 
 @csrf_exempt
 @require_POST
@@ -38,11 +58,8 @@ def phonepe_callback(request):
         # Find the transaction
         try:
             # Extract original transaction ID from merchant transaction ID
-            if merchant_transaction_id.startswith('MT'):
-                original_transaction_id = merchant_transaction_id[2:]  # Remove 'MT' prefix
-            else:
-                original_transaction_id = merchant_transaction_id
-                
+            original_transaction_id = merchant_transaction_id.removeprefix('MT')
+            
             transaction = PaymentTransaction.objects.get(transaction_id=original_transaction_id)
         except PaymentTransaction.DoesNotExist:
             logger.error(f"Transaction not found for ID: {merchant_transaction_id}")
@@ -81,109 +98,53 @@ def phonepe_callback(request):
 @require_POST
 def phonepe_webhook(request):
     """Handle PhonePe payment webhook"""
+    raw_body = request.body
+    
+    # Verify webhook signature
+    phonepe_gateway = PaymentGateway.objects.filter(
+        gateway_type='phonepe', 
+        is_active=True
+    ).first()
+    
+    if not phonepe_gateway:
+        logger.error("PhonePe gateway not configured")
+        return HttpResponse(status=400)
+    
+    # Extract signature from headers
+    signature = request.headers.get('X-VERIFY')
+    if not signature:
+        logger.error("No signature in PhonePe webhook")
+        return HttpResponse(status=400)
+    
+    # Verify signature
+    if not verify_phonepe_signature(raw_body, signature, phonepe_gateway):
+        logger.error("Invalid PhonePe webhook signature")
+        return HttpResponse(status=400)
+    
+    # Parse only once the signature over the raw bytes has checked out
     try:
-        # Get webhook data
-        webhook_data = json.loads(request.body)
-        logger.info(f"PhonePe webhook received: {webhook_data}")
-        
-        # Verify webhook signature
-        phonepe_gateway = PaymentGateway.objects.filter(
-            gateway_type='phonepe', 
-            is_active=True
-        ).first()
-        
-        if not phonepe_gateway:
-            logger.error("PhonePe gateway not configured")
-            return HttpResponse(status=400)
-        
-        # Extract signature from headers
-        signature = request.headers.get('X-VERIFY')
-        if not signature:
-            logger.error("No signature in PhonePe webhook")
-            return HttpResponse(status=400)
-        
-        # Verify signature
-        if not verify_phonepe_signature(webhook_data, signature, phonepe_gateway):
-            logger.error("Invalid PhonePe webhook signature")
-            return HttpResponse(status=400)
-        
-        # Process webhook
-        response_data = webhook_data.get('response', {})
-        merchant_transaction_id = response_data.get('merchantTransactionId')
-        
-        if merchant_transaction_id:
-            # Find and update transaction
-            try:
-                if merchant_transaction_id.startswith('MT'):
-                    original_transaction_id = merchant_transaction_id[2:]
-                else:
-                    original_transaction_id = merchant_transaction_id
-                
-                transaction = PaymentTransaction.objects.get(transaction_id=original_transaction_id)
-                
-                # Update transaction status based on webhook data
-                state = response_data.get('state')
-                if state == 'COMPLETED':
-                    transaction.status = 'success'
-                    transaction.gateway_response = webhook_data
-                    transaction.save()
-                    
-                    # Use OrderWorkflowService for payment success
-                    from orders.services import OrderWorkflowService
-                    if transaction.order:
-                        OrderWorkflowService.handle_payment_success(
-                            order=transaction.order,
-                            payment_details=webhook_data
-                        )
-                    
-                    logger.info(f"Payment successful via webhook: {merchant_transaction_id}")
-                
-                elif state == 'FAILED':
-                    transaction.status = 'failed'
-                    transaction.gateway_response = webhook_data
-                    transaction.save()
-                    
-                    # Use OrderWorkflowService for payment failure
-                    from orders.services import OrderWorkflowService
-                    if transaction.order:
-                        OrderWorkflowService.handle_payment_failure(
-                            order=transaction.order,
-                            error_details=webhook_data
-                        )
-                    
-                    logger.warning(f"Payment failed via webhook: {merchant_transaction_id}")
-                
-            except PaymentTransaction.DoesNotExist:
-                logger.error(f"Transaction not found in webhook: {merchant_transaction_id}")
-                return HttpResponse(status=404)
-                    
-                transaction = PaymentTransaction.objects.get(transaction_id=original_transaction_id)
-                
-                # Update transaction based on webhook data
-                payment_state = response_data.get('state')
-                if payment_state == 'COMPLETED':
-                    if transaction.status != 'success':
-                        transaction.mark_success(
-                            gateway_transaction_id=response_data.get('transactionId'),
-                            gateway_response=response_data
-                        )
-                        logger.info(f"Transaction {transaction.transaction_id} marked as successful via webhook")
-                elif payment_state == 'FAILED':
-                    if transaction.status not in ['failed', 'cancelled']:
-                        transaction.mark_failed(
-                            error_message=response_data.get('responseCodeDescription', 'Payment failed'),
-                            gateway_response=response_data
-                        )
-                        logger.info(f"Transaction {transaction.transaction_id} marked as failed via webhook")
-                
-            except PaymentTransaction.DoesNotExist:
-                logger.error(f"Transaction not found for webhook: {merchant_transaction_id}")
-        
-        return HttpResponse("OK")
-        
-    except Exception as e:
-        logger.error(f"PhonePe webhook error: {str(e)}")
-        return HttpResponse(status=500)
+        webhook_data = _parse_webhook_body(raw_body)
+    except ValueError as e:
+        logger.error(f"Unreadable PhonePe webhook body: {str(e)}")
+        return HttpResponse(status=400)
+    if not isinstance(webhook_data, dict):
+        logger.error("PhonePe webhook body is not a JSON object")
+        return HttpResponse(status=400)
+    logger.info(f"PhonePe webhook received: {webhook_data}")
+    
+    # Acknowledge now and apply the state change in the background; the task
+    # id is derived from the gateway transaction so redeliveries are traceable.
+    # A failed enqueue is not caught: the error response makes PhonePe redeliver
+    response_data = webhook_data.get('response') or {}
+    merchant_transaction_id = response_data.get('merchantTransactionId')
+    if merchant_transaction_id:
+        state = response_data.get('state')
+        apply_phonepe_webhook.apply_async(
+            args=[webhook_data],
+            task_id=f"phonepe:{merchant_transaction_id}:{state}"
+        )
+    
+    return HttpResponse(WEBHOOK_ACK_BODY, content_type="text/plain")
 
 
 @csrf_exempt
@@ -191,7 +152,7 @@ def phonepe_webhook(request):
 def phonepe_refund_webhook(request):
     """Handle PhonePe refund webhook"""
     try:
-        webhook_data = json.loads(request.body)
+        webhook_data = _parse_webhook_body(request.body)
         logger.info(f"PhonePe refund webhook received: {webhook_data}")
         
         # Process refund webhook
@@ -200,11 +161,8 @@ def phonepe_refund_webhook(request):
         
         if merchant_refund_id:
             try:
-                if merchant_refund_id.startswith('RF'):
-                    refund_transaction_id = merchant_refund_id[2:]
-                else:
-                    refund_transaction_id = merchant_refund_id
-                    
+                refund_transaction_id = merchant_refund_id.removeprefix('RF')
+                
                 refund_transaction = PaymentTransaction.objects.get(transaction_id=refund_transaction_id)
                 
                 refund_state = response_data.get('state')
@@ -226,7 +184,7 @@ def phonepe_refund_webhook(request):
             except PaymentTransaction.DoesNotExist:
                 logger.error(f"Refund transaction not found: {merchant_refund_id}")
         
-        return HttpResponse("OK")
+        return HttpResponse(WEBHOOK_ACK_BODY, content_type="text/plain")
         
     except Exception as e:
         logger.error(f"PhonePe refund webhook error: {str(e)}")
@@ -249,20 +207,29 @@ def initiate_phonepe_payment(request):
         # Get order
         from orders.models import Order  # Import here to avoid circular imports
         try:
-            order = Order.objects.get(id=order_id, user=request.user)
+            # Join the user so the processor's order.user access does not re-query
+            order = Order.objects.select_related('user').get(id=order_id, user=request.user)
         except Order.DoesNotExist:
             return JsonResponse({
                 'success': False,
                 'error': 'Order not found'
             })
         
-        # Get or create PhonePe payment method
+        # Reuse the user's UPI payment method (default first); only create one on first checkout
         from payments.models_advanced import PaymentMethod
-        payment_method, created = PaymentMethod.objects.get_or_create(
+        payment_method = PaymentMethod.objects.filter(
             user=request.user,
-            payment_type='upi',
-            defaults={'is_default': True}
-        )
+            payment_type='upi'
+        ).order_by('-is_default', '-created_at').first()
+        if payment_method is None:
+            # Only one default method is allowed per user
+            payment_method = PaymentMethod.objects.create(
+                user=request.user,
+                payment_type='upi',
+                is_default=not PaymentMethod.objects.filter(
+                    user=request.user, is_default=True
+                ).exists()
+            )
         
         # Initiate payment
         processor = PaymentProcessor()
@@ -293,7 +260,7 @@ def initiate_phonepe_payment(request):
         })
 
 
-def verify_phonepe_signature(data: dict, signature: str, gateway: PaymentGateway) -> bool:
+def verify_phonepe_signature(raw_body: bytes, signature: str, gateway: PaymentGateway) -> bool:
     """Verify PhonePe webhook signature"""
     try:
         # Get salt key from gateway config
@@ -305,40 +272,60 @@ def verify_phonepe_signature(data: dict, signature: str, gateway: PaymentGateway
             logger.error("Salt key not configured for PhonePe gateway")
             return False
         
-        # Create signature string
+        # Hash the body bytes exactly as received rather than a re-serialization,
+        # which may not match the byte order/escaping PhonePe signed
         # Note: Actual signature verification logic depends on PhonePe's specification
-        # This is a simplified version
-        data_string = json.dumps(data, separators=(',', ':'))
-        string_to_hash = f"{data_string}{salt_key}"
+        digest = hashlib.sha256(raw_body)
+        digest.update(salt_key.encode())
         
-        expected_signature = hashlib.sha256(string_to_hash.encode()).hexdigest() + "###" + str(salt_index)
+        expected_signature = digest.hexdigest() + "###" + str(salt_index)
         
-        return signature == expected_signature
+        # Constant-time comparison so the signature check does not leak timing
+        return hmac.compare_digest(signature, expected_signature)
         
     except Exception as e:
         logger.error(f"Signature verification error: {str(e)}")
         return False
 
 
+# Response field -> (model column, serializer) for payment_status_check
+STATUS_CHECK_FIELDS = {
+    'status': ('status', lambda transaction: transaction.status),
+    'amount': ('amount', lambda transaction: str(transaction.amount)),
+    'currency': ('currency', lambda transaction: transaction.currency),
+    'created_at': ('initiated_at', lambda transaction: transaction.initiated_at.isoformat()),
+}
+
+
+@cache_control(private=True, max_age=2)
 def payment_status_check(request, transaction_id):
-    """Check payment status"""
+    """Check payment status
+
+    Clients may pass ``?fields=status,amount`` to receive only a subset of
+    the status fields; unknown names are ignored.
+    """
     try:
-        transaction = PaymentTransaction.objects.get(transaction_id=transaction_id)
+        requested = [
+            name.strip() for name in request.GET.get('fields', '').split(',')
+            if name.strip() in STATUS_CHECK_FIELDS
+        ] or list(STATUS_CHECK_FIELDS)
+        
+        # Load only the columns needed for the response (skips gateway_response/metadata JSON)
+        transaction = PaymentTransaction.objects.only(
+            'user', *(STATUS_CHECK_FIELDS[name][0] for name in requested)
+        ).get(transaction_id=transaction_id)
         
         # Check if user is authorized to view this transaction
-        if request.user != transaction.user:
+        if request.user.id != transaction.user_id:
             return JsonResponse({
                 'success': False,
                 'error': 'Unauthorized'
             }, status=403)
         
-        return JsonResponse({
-            'success': True,
-            'status': transaction.status,
-            'amount': str(transaction.amount),
-            'currency': transaction.currency,
-            'created_at': transaction.initiated_at.isoformat()
-        })
+        response_data = {'success': True}
+        for name in requested:
+            response_data[name] = STATUS_CHECK_FIELDS[name][1](transaction)
+        return JsonResponse(response_data)
         
     except PaymentTransaction.DoesNotExist:
         return JsonResponse({
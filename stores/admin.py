@@ -4,6 +4,7 @@ from .models import Store, StoreStaff, StoreZipCoverage, StoreClosureRequest, De
 @admin.register(Store)
 class StoreAdmin(admin.ModelAdmin):
     list_display = ('name', 'store_code', 'owner', 'status', 'is_active', 'created_at')
+    list_select_related = ('owner',)
     list_filter = ('status', 'is_active', 'created_at', 'updated_at')
     search_fields = ('name', 'store_code', 'owner__username', 'address')
     readonly_fields = ('store_code', 'created_at', 'updated_at')
@@ -11,23 +12,49 @@ class StoreAdmin(admin.ModelAdmin):
 @admin.register(StoreStaff)
 class StoreStaffAdmin(admin.ModelAdmin):
     list_display = ('user', 'store', 'role', 'is_active', 'created_at')
+    list_select_related = ('user', 'store')
     list_filter = ('role', 'is_active', 'created_at')
     search_fields = ('user__username', 'store__name')
 
 @admin.register(StoreZipCoverage)
 class StoreZipCoverageAdmin(admin.ModelAdmin):
     list_display = ('store', 'zip_area', 'delivery_fee', 'min_order_value', 'is_active')
+    list_select_related = ('store', 'zip_area')
     list_filter = ('is_active', 'created_at')
     search_fields = ('store__name', 'zip_area__zip_code')
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).select_related('store', 'zip_area')
+        # Changelist rows only need the displayed columns; change forms load full rows
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.only(
+                'id', 'store', 'zip_area', 'delivery_fee', 'min_order_value', 'is_active',
+                'store__name', 'store__store_code',
+                'zip_area__zip_code', 'zip_area__city', 'zip_area__state'
+            )
+        return queryset
 
 @admin.register(StoreClosureRequest)
 class StoreClosureRequestAdmin(admin.ModelAdmin):
     list_display = ('store', 'reason', 'status', 'created_at', 'approved_by')
+    list_select_related = ('store', 'approved_by')
     list_filter = ('status', 'created_at')
     search_fields = ('store__name', 'reason')
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).select_related('store', 'approved_by')
+        # Changelist rows only need the displayed columns; change forms load full rows
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.only(
+                'id', 'store', 'reason', 'status', 'created_at', 'approved_by',
+                'store__name', 'store__store_code',
+                'approved_by__username', 'approved_by__user_type'
+            )
+        return queryset
 
 @admin.register(DeliverySlot)
 class DeliverySlotAdmin(admin.ModelAdmin):
     list_display = ('store', 'start_time', 'end_time', 'is_active', 'max_orders')
+    list_select_related = ('store',)
     list_filter = ('is_active', 'store')
     search_fields = ('store__name',)
@@ -1,11 +1,43 @@
 from django import forms
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists
 from locations.models import ZipArea
-from stores.models import StoreZipCoverage, StoreStaff
-from delivery.models import DeliveryAgentZipCoverage
+from stores.models import Store, StoreZipCoverage, StoreStaff
+from delivery.models import DeliveryAgentZipCoverage, DELIVERY_AGENTS_VERSION_CACHE_KEY
 
 User = get_user_model()
 
+
+@transaction.atomic
+def sync_zip_coverages(coverage_model, owner_field, owner, selected_ids):
+    """Make exactly the given ZIP area IDs active coverages for a store/agent
+    
+    Runs two statements regardless of how many areas are selected: deactivate
+    deselected coverages, then upsert the selected ones as active. Both run in
+    one transaction so a failure never leaves the coverage half-updated.
+    """
+    coverage_model.objects.filter(
+        **{owner_field: owner}, is_active=True
+    ).exclude(zip_area_id__in=selected_ids).update(is_active=False)
+    
+    # INSERT ... ON CONFLICT (owner, zip_area) DO UPDATE SET is_active = true
+    coverage_model.objects.bulk_create(
+        [
+            coverage_model(**{owner_field: owner}, zip_area_id=zip_area_id, is_active=True)
+            for zip_area_id in selected_ids
+        ],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=[owner_field, 'zip_area'],
+        update_fields=['is_active']
+    )
+    
+    # Coverage decides which agents a store sees; bulk writes skip model save(), so
+    # reset the agents version once committed, for the cached agent fragments and ETags
+    transaction.on_commit(lambda: cache.delete(DELIVERY_AGENTS_VERSION_CACHE_KEY))
+
 class StoreStaffCreateForm(forms.Form):
     """Form for creating new store staff members"""
     
@@ -63,24 +95,35 @@ class StoreStaffCreateForm(forms.Form):
         kwargs.pop('instance', None)
         super().__init__(*args, **kwargs)
     
-    def clean_staff_id(self):
-        staff_id = self.cleaned_data['staff_id']
+    def clean(self):
+        cleaned_data = super().clean()
+        staff_id = cleaned_data.get('staff_id')
+        email = cleaned_data.get('email')
         
-        if self.store:
+        # Check both uniqueness rules in one round trip instead of one query per field
+        checks = {}
+        if email:
+            # Check if email is already used
+            checks['email_taken'] = Exists(User.objects.filter(email=email).values('pk'))
+        if self.store and staff_id:
             # Check if staff ID already exists in this store
-            if StoreStaff.objects.filter(store=self.store, staff_id=staff_id).exists():
-                raise forms.ValidationError('A staff member with this ID already exists in your store.')
+            checks['staff_id_taken'] = Exists(
+                StoreStaff.objects.filter(store_id=self.store.pk, staff_id=staff_id).values('pk')
+            )
+        if not checks:
+            return cleaned_data
         
-        return staff_id
-    
-    def clean_email(self):
-        email = self.cleaned_data['email']
+        if self.store:
+            taken = Store.objects.filter(pk=self.store.pk).annotate(**checks).values(*checks).first() or {}
+        else:
+            taken = {'email_taken': User.objects.filter(email=email).values('pk').exists()}
         
-        # Check if email is already used
-        if User.objects.filter(email=email).exists():
-            raise forms.ValidationError('A user with this email already exists.')
+        if taken.get('staff_id_taken'):
+            self.add_error('staff_id', 'A staff member with this ID already exists in your store.')
+        if taken.get('email_taken'):
+            self.add_error('email', 'A user with this email already exists.')
         
-        return email
+        return cleaned_data
 
 class StaffLoginForm(forms.Form):
     """Custom login form for store staff"""
@@ -111,8 +154,8 @@ class StaffLoginForm(forms.Form):
 
 class StoreZipCoverageForm(forms.Form):
     """Form for store managers to select ZIP areas they want to serve"""
-    zip_areas = forms.ModelMultipleChoiceField(
-        queryset=ZipArea.objects.filter(is_active=True),
+    zip_areas = forms.TypedMultipleChoiceField(
+        coerce=int,
         widget=forms.CheckboxSelectMultiple,
         required=False,
         help_text="Select all ZIP areas where you want to deliver products"
@@ -121,40 +164,26 @@ class StoreZipCoverageForm(forms.Form):
     def __init__(self, *args, **kwargs):
         self.store = kwargs.pop('store', None)
         super().__init__(*args, **kwargs)
+        # Cached (id, label) pairs instead of a ZipArea queryset on every render
+        self.fields['zip_areas'].choices = ZipArea.get_active_choices()
         
         if self.store:
             # Pre-select currently covered ZIP areas
-            current_zip_areas = ZipArea.objects.filter(
-                store_coverages__store=self.store,
-                store_coverages__is_active=True
+            self.fields['zip_areas'].initial = list(
+                StoreZipCoverage.objects.active_for(self.store).values_list('zip_area_id', flat=True)
             )
-            self.fields['zip_areas'].initial = current_zip_areas
     
     def save(self):
         if not self.store:
             return
         
-        selected_zip_areas = self.cleaned_data['zip_areas']
-        
-        # Deactivate all current coverages
-        StoreZipCoverage.objects.filter(store=self.store).update(is_active=False)
-        
-        # Create/activate coverage for selected areas
-        for zip_area in selected_zip_areas:
-            coverage, created = StoreZipCoverage.objects.get_or_create(
-                store=self.store,
-                zip_area=zip_area,
-                defaults={'is_active': True}
-            )
-            if not created:
-                coverage.is_active = True
-                coverage.save()
+        sync_zip_coverages(StoreZipCoverage, 'store', self.store, self.cleaned_data['zip_areas'])
 
 
 class DeliveryAgentZipCoverageForm(forms.Form):
     """Form for delivery agents to select ZIP areas they can serve"""
-    zip_areas = forms.ModelMultipleChoiceField(
-        queryset=ZipArea.objects.filter(is_active=True),
+    zip_areas = forms.TypedMultipleChoiceField(
+        coerce=int,
         widget=forms.CheckboxSelectMultiple,
         required=False,
         help_text="Select all ZIP areas where you can deliver orders"
@@ -163,31 +192,18 @@ class DeliveryAgentZipCoverageForm(forms.Form):
     def __init__(self, *args, **kwargs):
         self.agent = kwargs.pop('agent', None)
         super().__init__(*args, **kwargs)
+        # Cached (id, label) pairs instead of a ZipArea queryset on every render
+        self.fields['zip_areas'].choices = ZipArea.get_active_choices()
         
         if self.agent:
             # Pre-select currently covered ZIP areas
-            current_zip_areas = ZipArea.objects.filter(
-                delivery_agent_coverages__agent=self.agent,
-                delivery_agent_coverages__is_active=True
-            )
-            self.fields['zip_areas'].initial = current_zip_areas
+            self.fields['zip_areas'].initial = list(DeliveryAgentZipCoverage.objects.filter(
+                agent=self.agent,
+                is_active=True
+            ).values_list('zip_area_id', flat=True))
     
     def save(self):
         if not self.agent:
             return
         
-        selected_zip_areas = self.cleaned_data['zip_areas']
-        
-        # Deactivate all current coverages
-        DeliveryAgentZipCoverage.objects.filter(agent=self.agent).update(is_active=False)
-        
-        # Create/activate coverage for selected areas
-        for zip_area in selected_zip_areas:
-            coverage, created = DeliveryAgentZipCoverage.objects.get_or_create(
-                agent=self.agent,
-                zip_area=zip_area,
-                defaults={'is_active': True}
-            )
-            if not created:
-                coverage.is_active = True
-                coverage.save()
+        sync_zip_coverages(DeliveryAgentZipCoverage, 'agent', self.agent, self.cleaned_data['zip_areas'])
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-17 07:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0001_initial'),
+        ('stores', '0005_alter_storestaff_role'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deliveryslot',
+            index=models.Index(fields=['store', 'zip_area', 'is_active', 'start_time'], name='stores_deli_store_i_9245be_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storeclosurerequest',
+            index=models.Index(fields=['store', 'status', 'requested_until'], name='stores_stor_store_i_e8f88e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storezipcoverage',
+            index=models.Index(fields=['store', 'is_active'], name='stores_stor_store_i_6de85c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storezipcoverage',
+            index=models.Index(fields=['zip_area', 'is_active'], name='stores_stor_zip_are_38d9d3_idx'),
+        ),
+    ]
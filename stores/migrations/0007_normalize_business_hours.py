@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def normalize_business_hours(apps, schema_editor):
+    """Zero-pad stored opening/closing times so they compare correctly in SQL"""
+    Store = apps.get_model('stores', 'Store')
+    for store in Store.objects.exclude(business_hours={}).only('pk', 'business_hours'):
+        changed = False
+        for hours in store.business_hours.values():
+            if not isinstance(hours, dict):
+                continue
+            for key in ('open', 'close'):
+                try:
+                    hour, minute = (int(part) for part in hours[key].split(':'))
+                except (KeyError, ValueError, TypeError, AttributeError):
+                    continue
+                value = f"{hour:02d}:{minute:02d}"
+                if value != hours[key]:
+                    hours[key] = value
+                    changed = True
+        if changed:
+            Store.objects.filter(pk=store.pk).update(business_hours=store.business_hours)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_business_hours, migrations.RunPython.noop),
+    ]
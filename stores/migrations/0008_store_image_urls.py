@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-17 07:11
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def populate_image_urls(apps, schema_editor):
+    """Resolve URLs for logos/banners uploaded before the cached fields existed"""
+    Store = apps.get_model('stores', 'Store')
+    stores = Store.objects.exclude(
+        (Q(logo='') | Q(logo__isnull=True)) & (Q(banner_image='') | Q(banner_image__isnull=True))
+    ).only('pk', 'logo', 'banner_image')
+    for store in stores:
+        Store.objects.filter(pk=store.pk).update(
+            logo_url=store.logo.url if store.logo else '',
+            banner_url=store.banner_image.url if store.banner_image else ''
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0007_normalize_business_hours'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='banner_url',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='logo_url',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.RunPython(populate_image_urls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 07:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0008_store_image_urls'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='storeclosurerequest',
+            name='stores_stor_store_i_e8f88e_idx',
+        ),
+        migrations.AddIndex(
+            model_name='storeclosurerequest',
+            index=models.Index(condition=models.Q(('status', 'approved')), fields=['store', 'requested_until'], name='closure_active_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-17 07:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_search_trigram_indexes'),
+        ('stores', '0009_closure_active_partial_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stafforderassignment',
+            index=models.Index(fields=['staff', 'status', 'assigned_at'], name='stores_staf_staff_i_eca761_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storestaff',
+            index=models.Index(fields=['user', 'is_active'], name='stores_stor_user_id_fc403c_idx'),
+        ),
+    ]
@@ -1,5 +1,10 @@
 from django.db import models
+from django.core.cache import cache
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Now
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.functional import cached_property
 from decimal import Decimal
 from core.models import TimeStampedModel
 from locations.models import ZipArea
@@ -7,6 +12,83 @@ import uuid
 
 User = get_user_model()
 
+# Counts behind the store dashboard cards, invalidated by Order and StoreProduct writes
+STORE_DASHBOARD_STATS_CACHE_KEY = 'store_dash_stats:{store_id}'
+
+# Id of the store a user owns or staffs, cached for the polling endpoints by
+# core.decorators; Store and StoreStaff writes clear it, the short timeout covers
+# cascades and owner changes
+USER_STORE_ID_CACHE_KEY = 'user_store_id:{user_id}'
+USER_STORE_ID_CACHE_TIMEOUT = 60
+
+# Business hours keys, indexed by datetime.weekday()
+WEEKDAY_NAMES = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+def parse_hhmm(value):
+    """Parse an 'HH:MM' business hours value into an (hour, minute) tuple"""
+    hour, minute = value.split(':')
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid time: {value}")
+    return hour, minute
+
+class StoreQuerySet(models.QuerySet):
+    """Store queries that evaluate availability in the database"""
+    
+    def with_active_closure(self):
+        """Annotate whether each store has an approved closure still in effect"""
+        return self.annotate(
+            has_active_closure=models.Exists(
+                StoreClosureRequest.objects.filter(
+                    store=models.OuterRef('pk'),
+                    status='approved',
+                    requested_until__gt=Now()
+                )
+            )
+        )
+    
+    def currently_open(self):
+        """Stores marked open without an active closure (business hours are checked by is_open)"""
+        return self.filter(status='open').with_active_closure().filter(has_active_closure=False)
+    
+    def open_now(self):
+        """Currently open stores including today's business hours, evaluated in SQL
+        
+        Mirrors Store.is_open: stores without business hours are always open, and
+        days without opening/closing times fall back to their is_open flag. Relies
+        on times being stored zero-padded ('HH:MM'), which Store.save() ensures.
+        """
+        now = timezone.localtime()
+        day = WEEKDAY_NAMES[now.weekday()]
+        current_time = now.strftime('%H:%M:%S')
+        
+        # Cast so the comparisons below are plain text lookups, not JSON key lookups
+        return self.currently_open().annotate(
+            today_open=Cast(KT(f'business_hours__{day}__open'), models.CharField()),
+            today_close=Cast(KT(f'business_hours__{day}__close'), models.CharField()),
+        ).filter(
+            models.Q(business_hours={})
+            | models.Q(today_open__lte=current_time, today_close__gte=current_time)
+            | (
+                models.Q(**{f'business_hours__{day}__is_open': True})
+                & ~models.Q(**{f'business_hours__{day}__has_keys': ['open', 'close']})
+            )
+        )
+    
+    def prefetch_active_closures(self):
+        """Prefetch approved closures still in effect into ``_active_closures`` for list pages"""
+        return self.prefetch_related(
+            models.Prefetch(
+                'closure_requests',
+                queryset=StoreClosureRequest.objects.filter(
+                    status='approved',
+                    requested_until__gt=Now()
+                ),
+                to_attr='_active_closures'
+            )
+        )
+
 class Store(TimeStampedModel):
     """Store model for multi-store platform"""
     STORE_STATUS = [
@@ -38,6 +120,9 @@ class Store(TimeStampedModel):
     # Branding
     logo = models.ImageField(upload_to='store_logos/', blank=True, null=True)
     banner_image = models.ImageField(upload_to='store_banners/', blank=True, null=True)
+    # Resolved storage URLs, kept in sync by save() so pages don't ask the storage backend
+    logo_url = models.CharField(max_length=500, blank=True, editable=False)
+    banner_url = models.CharField(max_length=500, blank=True, editable=False)
     
     # Business Hours (stored as JSON for flexibility)
     business_hours = models.JSONField(default=dict, blank=True)
@@ -53,45 +138,96 @@ class Store(TimeStampedModel):
     # ZIP code coverage
     zip_coverage = models.ManyToManyField(ZipArea, through='StoreZipCoverage')
     
+    objects = StoreQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.name} ({self.store_code})"
     
-    @property
-    def is_open(self):
-        from django.utils import timezone
-        from datetime import datetime, time
-        import json
+    @classmethod
+    def is_open_bulk(cls, store_ids):
+        """Map store id -> is_open for many stores with a single closure query"""
+        return {
+            store.pk: store.is_open
+            for store in cls.objects.filter(pk__in=store_ids).prefetch_active_closures()
+        }
+    
+    def save(self, *args, **kwargs):
+        self.business_hours = self.normalize_business_hours(self.business_hours)
+        super().save(*args, **kwargs)
+        
+        # File names are only final once the upload has been stored above
+        logo_url = self.logo.url if self.logo else ''
+        banner_url = self.banner_image.url if self.banner_image else ''
+        if (logo_url, banner_url) != (self.logo_url, self.banner_url):
+            self.logo_url, self.banner_url = logo_url, banner_url
+            Store.objects.filter(pk=self.pk).update(logo_url=logo_url, banner_url=banner_url)
         
+        cache.delete(USER_STORE_ID_CACHE_KEY.format(user_id=self.owner_id))
+    
+    def delete(self, *args, **kwargs):
+        owner_id = self.owner_id
+        result = super().delete(*args, **kwargs)
+        cache.delete(USER_STORE_ID_CACHE_KEY.format(user_id=owner_id))
+        return result
+    
+    @staticmethod
+    def normalize_business_hours(business_hours):
+        """Zero-pad opening/closing times to 'HH:MM' so reads need no parsing"""
+        if not isinstance(business_hours, dict):
+            return business_hours
+        
+        for hours in business_hours.values():
+            if not isinstance(hours, dict):
+                continue
+            for key in ('open', 'close'):
+                try:
+                    hours[key] = '%02d:%02d' % parse_hhmm(hours[key])
+                except (KeyError, ValueError, TypeError, AttributeError):
+                    # Leave missing/blank/invalid values as entered
+                    pass
+        return business_hours
+    
+    @cached_property
+    def is_open(self):
         if self.status != 'open':
             return False
         
-        # Check if store has closure requests
-        active_closure = self.closure_requests.filter(
-            status='approved',
-            requested_until__gt=timezone.now()
-        ).exists()
+        # Check if store has closure requests (already known when loaded via
+        # prefetch_active_closures or with_active_closure)
+        active_closures = getattr(self, '_active_closures', None)
+        if active_closures is not None:
+            active_closure = bool(active_closures)
+        else:
+            active_closure = getattr(self, 'has_active_closure', None)
+        if active_closure is None:
+            active_closure = self.closure_requests.filter(
+                status='approved',
+                requested_until__gt=timezone.now()
+            ).exists()
         
         if active_closure:
             return False
         
+        # If no business hours defined, assume always open (for testing)
+        if not self.business_hours:
+            return True
+        
         # Check business hours
-        now = timezone.now()
-        weekday = now.strftime('%A').lower()
+        now = timezone.localtime()
+        hours = self.business_hours.get(WEEKDAY_NAMES[now.weekday()])
         
-        if self.business_hours and weekday in self.business_hours:
-            hours = self.business_hours[weekday]
-            
+        if hours:
             # Check if store has opening/closing times for today
             if 'open' in hours and 'close' in hours:
                 try:
-                    open_time = datetime.strptime(hours['open'], '%H:%M').time()
-                    close_time = datetime.strptime(hours['close'], '%H:%M').time()
-                    current_time = now.time()
+                    open_time = parse_hhmm(hours['open']) + (0,)
+                    close_time = parse_hhmm(hours['close']) + (0,)
+                    current_time = (now.hour, now.minute, now.second)
                     
                     # Check if current time is within business hours
                     if open_time <= current_time <= close_time:
                         return True
-                except (ValueError, TypeError):
+                except (ValueError, TypeError, AttributeError):
                     # If there's an error parsing times, assume closed
                     pass
             
@@ -99,10 +235,6 @@ class Store(TimeStampedModel):
             elif hours.get('is_open', False):
                 return True
         
-        # If no business hours defined, assume always open (for testing)
-        if not self.business_hours:
-            return True
-        
         return False
     
     class Meta:
@@ -130,12 +262,22 @@ class StoreStaff(TimeStampedModel):
             existing_count = StoreStaff.objects.filter(store=self.store).count()
             self.staff_id = f"ST{self.store.id:03d}{existing_count + 1:03d}"
         super().save(*args, **kwargs)
+        cache.delete(USER_STORE_ID_CACHE_KEY.format(user_id=self.user_id))
+    
+    def delete(self, *args, **kwargs):
+        user_id = self.user_id
+        result = super().delete(*args, **kwargs)
+        cache.delete(USER_STORE_ID_CACHE_KEY.format(user_id=user_id))
+        return result
     
     def __str__(self):
         return f"{self.user.username} - {self.store.name} ({self.get_role_display()})"
     
     class Meta:
         unique_together = [['store', 'user'], ['store', 'staff_id']]
+        indexes = [
+            models.Index(fields=['user', 'is_active']),
+        ]
 
 class StaffOrderAssignment(TimeStampedModel):
     """Assignment of orders to store staff for processing"""
@@ -162,6 +304,18 @@ class StaffOrderAssignment(TimeStampedModel):
     
     class Meta:
         ordering = ['-assigned_at']
+        indexes = [
+            models.Index(fields=['staff', 'status', 'assigned_at']),
+        ]
+
+class StoreZipCoverageQuerySet(models.QuerySet):
+    """Store ZIP coverage lookups shared by the dashboard, agent and coverage views"""
+    
+    def active_for(self, store):
+        """The store's active coverage rows with the ZIP code and city they display"""
+        return self.filter(store=store, is_active=True).select_related('zip_area').only(
+            'id', 'store_id', 'zip_area__zip_code', 'zip_area__city'
+        )
 
 class StoreZipCoverage(TimeStampedModel):
     """Store coverage for specific ZIP codes with custom settings"""
@@ -175,20 +329,28 @@ class StoreZipCoverage(TimeStampedModel):
     
     is_active = models.BooleanField(default=True)
     
-    def get_delivery_fee(self):
-        return self.delivery_fee or self.zip_area.default_delivery_fee
+    objects = StoreZipCoverageQuerySet.as_manager()
     
-    def get_min_order_value(self):
-        return self.min_order_value or self.zip_area.default_min_order_value
+    # Callers that already hold the ZipArea (or prefetched it) can pass it in
+    # to avoid loading self.zip_area when falling back to the area defaults
+    def get_delivery_fee(self, zip_area=None):
+        return self.delivery_fee or (zip_area or self.zip_area).default_delivery_fee
     
-    def get_delivery_time(self):
-        return self.delivery_time_minutes or self.zip_area.default_delivery_time_minutes
+    def get_min_order_value(self, zip_area=None):
+        return self.min_order_value or (zip_area or self.zip_area).default_min_order_value
+    
+    def get_delivery_time(self, zip_area=None):
+        return self.delivery_time_minutes or (zip_area or self.zip_area).default_delivery_time_minutes
     
     def __str__(self):
         return f"{self.store.name} -> {self.zip_area.zip_code}"
     
     class Meta:
         unique_together = ['store', 'zip_area']
+        indexes = [
+            models.Index(fields=['store', 'is_active']),
+            models.Index(fields=['zip_area', 'is_active']),
+        ]
 
 class StoreClosureRequest(TimeStampedModel):
     """Store closure requests for admin approval"""
@@ -213,6 +375,14 @@ class StoreClosureRequest(TimeStampedModel):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Only approved closures can close a store, so index just those rows
+            models.Index(
+                fields=['store', 'requested_until'],
+                name='closure_active_idx',
+                condition=models.Q(status='approved')
+            ),
+        ]
 
 class DeliverySlot(TimeStampedModel):
     """Delivery time slots for stores"""
@@ -233,3 +403,6 @@ class DeliverySlot(TimeStampedModel):
     
     class Meta:
         ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['store', 'zip_area', 'is_active', 'start_time']),
+        ]
@@ -13,17 +13,95 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView, ListView, DetailView, View
 from django.contrib import messages
+from django.core.cache import cache
 from django.http import JsonResponse
 from django.utils.decorators import method_decorator
-from django.db.models import Q, Count, Sum
+from django.views.decorators.cache import cache_control
+from django.views.decorators.vary import vary_on_cookie
+from django.db import transaction
+from django.db.models import Q, Count, Sum, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from datetime import datetime, timedelta
+from django.utils.dateparse import parse_datetime
+from datetime import date, timedelta
 import json
 
-from .models import Store, StaffOrderAssignment
-from orders.models import Order, OrderStatusHistory
+from .models import StaffOrderAssignment
+from orders.models import (
+    Order, OrderItem, OrderStatusHistory, PENDING_ORDER_STATUSES, STORE_ORDER_DASHBOARD_CACHE_KEY, clear_store_order_caches
+)
 from orders.services import OrderStatusService, OrderWorkflowService, OrderAnalyticsService
-from core.decorators import store_required, StoreRequiredMixin
+from core.decorators import get_user_store, store_required, StoreRequiredMixin
+from core.date_utils import day_bounds
+from core.pagination import PkPaginator
+
+
+def _parse_order_cursor(value):
+    """Parse a '<iso created_at>,<id>' orders cursor, or None if it is missing or malformed"""
+    created_at, _, order_id = value.rpartition(',')
+    try:
+        created_at = parse_datetime(created_at)
+        order_id = int(order_id)
+    except ValueError:
+        return None
+    if created_at is None:
+        return None
+    return created_at, order_id
+
+
+def _build_dashboard_context(store):
+    """Order figures for the store order dashboard"""
+    context = {}
+    
+    # Get order statistics for today
+    today = timezone.now().date()
+    today_start, today_end = day_bounds(today)
+    today_orders = Order.objects.filter(store=store, created_at__gte=today_start, created_at__lt=today_end)
+    
+    # All of today's figures in one query using conditional aggregates
+    today_stats = today_orders.aggregate(
+        total_orders=Count('id'),
+        pending_orders=Count('id', filter=Q(status__in=PENDING_ORDER_STATUSES)),
+        preparing_orders=Count('id', filter=Q(status='preparing')),
+        ready_orders=Count('id', filter=Q(status__in=['packed', 'ready_for_pickup'])),
+        completed_orders=Count('id', filter=Q(status='delivered')),
+        revenue=Sum('total_amount', filter=Q(status='delivered'))
+    )
+    today_stats['revenue'] = today_stats['revenue'] or 0
+    context['today_stats'] = today_stats
+    
+    # Get pending orders that need immediate attention
+    context['pending_orders'] = list(Order.objects.filter(
+        store=store,
+        status__in=['placed', 'confirmed', 'preparing']
+    ).select_related('user').order_by('created_at')[:10])
+    
+    # Get orders by status for quick overview (one GROUP BY instead of a COUNT per status)
+    counts = dict(
+        Order.objects.filter(store=store).order_by().values_list('status').annotate(count=Count('id'))
+    )
+    status_counts = {}
+    for status_code, status_name in Order.ORDER_STATUS:
+        status_counts[status_code] = {
+            'name': status_name,
+            'count': counts.get(status_code, 0)
+        }
+    
+    context['status_counts'] = status_counts
+    
+    # Get recent order activity
+    context['recent_orders'] = list(
+        Order.objects.filter(store=store).select_related('user').order_by('-created_at')[:5]
+    )
+    
+    # Get weekly analytics
+    week_ago = timezone.now() - timedelta(days=7)
+    context['weekly_analytics'] = OrderAnalyticsService.get_order_stats(
+        store=store,
+        date_from=week_ago.date()
+    )
+    
+    return context
 
 
 class StoreOrderDashboardView(StoreRequiredMixin, TemplateView):
@@ -40,58 +118,21 @@ class StoreOrderDashboardView(StoreRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Get the store for the current user (owners only)
-        try:
-            store = Store.objects.get(owner=self.request.user)
-        except Store.DoesNotExist:
+        # Get the store for the current user
+        store = get_user_store(self.request)
+        if not store:
             messages.error(self.request, 'No store found for your account.')
             return context
         
         context['store'] = store
         
-        # Get order statistics for today
-        today = timezone.now().date()
-        today_orders = Order.objects.filter(store=store, created_at__date=today)
-        
-        context['today_stats'] = {
-            'total_orders': today_orders.count(),
-            'pending_orders': today_orders.filter(status__in=['placed', 'confirmed']).count(),
-            'preparing_orders': today_orders.filter(status='preparing').count(),
-            'ready_orders': today_orders.filter(status__in=['packed', 'ready_for_pickup']).count(),
-            'completed_orders': today_orders.filter(status='delivered').count(),
-            'revenue': today_orders.filter(status='delivered').aggregate(
-                total=Sum('total_amount'))['total'] or 0
-        }
-        
-        # Get pending orders that need immediate attention
-        pending_orders = Order.objects.filter(
-            store=store,
-            status__in=['placed', 'confirmed', 'preparing']
-        ).order_by('created_at')[:10]
-        
-        context['pending_orders'] = pending_orders
-        
-        # Get orders by status for quick overview
-        status_counts = {}
-        for status_code, status_name in Order.ORDER_STATUS:
-            count = Order.objects.filter(store=store, status=status_code).count()
-            status_counts[status_code] = {
-                'name': status_name,
-                'count': count
-            }
-        
-        context['status_counts'] = status_counts
-        
-        # Get recent order activity
-        recent_orders = Order.objects.filter(store=store).order_by('-created_at')[:5]
-        context['recent_orders'] = recent_orders
-        
-        # Get weekly analytics
-        week_ago = timezone.now() - timedelta(days=7)
-        context['weekly_analytics'] = OrderAnalyticsService.get_order_stats(
-            store=store,
-            date_from=week_ago.date()
-        )
+        # Order figures change on the order of seconds, so polling managers
+        # share a briefly cached copy; Order.save() clears it for the store
+        context.update(cache.get_or_set(
+            STORE_ORDER_DASHBOARD_CACHE_KEY.format(store_id=store.id),
+            lambda: _build_dashboard_context(store),
+            timeout=15
+        ))
         
         return context
 
@@ -102,6 +143,7 @@ class StoreOrderListView(StoreRequiredMixin, ListView):
     template_name = 'stores/orders/list.html'
     context_object_name = 'orders'
     paginate_by = 25
+    paginator_class = PkPaginator
     
     def dispatch(self, request, *args, **kwargs):
         # Only allow store owners, not staff
@@ -111,15 +153,21 @@ class StoreOrderListView(StoreRequiredMixin, ListView):
         return super().dispatch(request, *args, **kwargs)
     
     def get_queryset(self):
-        # Get the store for the current user (owners only)
-        try:
-            store = Store.objects.get(owner=self.request.user)
-        except Store.DoesNotExist:
+        # Get the store for the current user
+        store = get_user_store(self.request)
+        if not store:
             return Order.objects.none()
         
-        queryset = Order.objects.filter(store=store).select_related(
-            'user', 'delivery_address'
-        ).prefetch_related('items__store_product__product')
+        # The list only shows how many items an order has, so count them in a
+        # correlated subquery rather than prefetching every line item
+        item_count = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+            count=Count('id')
+        ).values('count')
+        queryset = Order.objects.filter(store=store).select_related('user').only(
+            # Just the columns the list template renders
+            'order_number', 'status', 'payment_status', 'total_amount', 'created_at', 'store',
+            'user__first_name', 'user__last_name', 'user__email', 'user__phone_number'
+        ).annotate(item_count=Coalesce(Subquery(item_count), 0))
         
         # Apply filters
         status_filter = self.request.GET.get('status', '').strip()
@@ -131,11 +179,12 @@ class StoreOrderListView(StoreRequiredMixin, ListView):
             queryset = queryset.filter(payment_status=payment_status_filter)
         
         date_filter = self.request.GET.get('date', '').strip()
-        if date_filter == 'today':
-            queryset = queryset.filter(created_at__date=timezone.now().date())
-        elif date_filter == 'yesterday':
-            yesterday = timezone.now().date() - timedelta(days=1)
-            queryset = queryset.filter(created_at__date=yesterday)
+        if date_filter in ('today', 'yesterday'):
+            day = timezone.now().date()
+            if date_filter == 'yesterday':
+                day -= timedelta(days=1)
+            day_start, day_end = day_bounds(day)
+            queryset = queryset.filter(created_at__gte=day_start, created_at__lt=day_end)
         elif date_filter == 'week':
             week_ago = timezone.now() - timedelta(days=7)
             queryset = queryset.filter(created_at__gte=week_ago)
@@ -150,28 +199,50 @@ class StoreOrderListView(StoreRequiredMixin, ListView):
                 Q(user__email__icontains=search) |
                 Q(user__first_name__icontains=search) |
                 Q(user__last_name__icontains=search) |
-                Q(user__phone__icontains=search)
+                Q(user__phone_number__icontains=search)
             )
         
         # Sort orders
         sort_by = self.request.GET.get('sort', '-created_at')
-        if sort_by in ['-created_at', 'created_at', '-total_amount', 'total_amount', 'status']:
-            queryset = queryset.order_by(sort_by)
+        if sort_by not in ['-created_at', 'created_at', '-total_amount', 'total_amount', 'status']:
+            sort_by = '-created_at'
+        self.sort_by = sort_by
+        if sort_by == '-created_at':
+            # id breaks created_at ties so the keyset pages below never skip or repeat a row
+            queryset = queryset.order_by('-created_at', '-id')
         else:
-            queryset = queryset.order_by('-created_at')
+            queryset = queryset.order_by(sort_by)
         
         return queryset
     
+    def paginate_queryset(self, queryset, page_size):
+        self.next_cursor = None
+        if getattr(self, 'sort_by', None) != '-created_at':
+            return super().paginate_queryset(queryset, page_size)
+        
+        # Newest-first (the default) is keyset-paginated: each page seeks past the
+        # previous page's last (created_at, id) on the (store, -created_at, -id)
+        # index instead of OFFSET-scanning the store's order history
+        cursor = _parse_order_cursor(self.request.GET.get('after', ''))
+        if cursor:
+            cursor_created_at, cursor_id = cursor
+            queryset = queryset.filter(
+                Q(created_at__lt=cursor_created_at) |
+                Q(created_at=cursor_created_at, id__lt=cursor_id)
+            )
+        
+        orders = list(queryset[:page_size + 1])
+        if len(orders) > page_size:
+            orders = orders[:page_size]
+            last_order = orders[-1]
+            self.next_cursor = f"{last_order.created_at.isoformat()},{last_order.id}"
+        return None, None, orders, False
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Get store
-        try:
-            store = Store.objects.get(owner=self.request.user)
-        except Store.DoesNotExist:
-            store = Store.objects.filter(storestaff__user=self.request.user).first()
-        
-        context['store'] = store
+        # Get store (already looked up by get_queryset)
+        context['store'] = get_user_store(self.request)
         context['order_statuses'] = Order.ORDER_STATUS
         context['payment_statuses'] = Order.PAYMENT_STATUS
         context['current_filters'] = {
@@ -181,6 +252,8 @@ class StoreOrderListView(StoreRequiredMixin, ListView):
             'search': self.request.GET.get('search', ''),
             'sort': self.request.GET.get('sort', '-created_at'),
         }
+        context['next_cursor'] = self.next_cursor
+        context['after_cursor'] = self.request.GET.get('after', '')
         
         return context
 
@@ -201,15 +274,26 @@ class StoreOrderDetailView(StoreRequiredMixin, DetailView):
         return super().dispatch(request, *args, **kwargs)
     
     def get_queryset(self):
-        # Limit to orders from the user's store (owners only)
-        try:
-            store = Store.objects.get(owner=self.request.user)
-        except Store.DoesNotExist:
+        # Limit to orders from the user's store
+        store = get_user_store(self.request)
+        if not store:
             return Order.objects.none()
         
+        # Line items carry only the columns the detail template renders
+        items = OrderItem.objects.select_related(
+            'store_product__product__category__parent'
+        ).only(
+            'order', 'quantity', 'unit_price', 'total_price',
+            'store_product__product__name', 'store_product__product__sku',
+            'store_product__product__image', 'store_product__product__category__name',
+            'store_product__product__category__parent__name'
+        )
         return Order.objects.filter(store=store).select_related(
-            'user', 'store', 'delivery_address'
-        ).prefetch_related('items__store_product__product', 'status_history__updated_by')
+            'user', 'store', 'delivery_address', 'delivery_assignment__agent'
+        ).prefetch_related(
+            Prefetch('items', queryset=items),
+            Prefetch('status_history', queryset=OrderStatusHistory.objects.select_related('updated_by'))
+        )
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -218,25 +302,27 @@ class StoreOrderDetailView(StoreRequiredMixin, DetailView):
         # Get store
         context['store'] = order.store
         
-        # Add status history
-        context['status_history'] = order.status_history.select_related('updated_by').all()
+        # Add status history (prefetched in get_queryset)
+        context['status_history'] = order.status_history.all()
         
         # Add possible next statuses based on current status
         context['next_statuses'] = OrderStatusService.get_next_possible_statuses(order.status)
         
-        # Add order items with pricing details
-        context['order_items'] = order.items.select_related('store_product__product').all()
+        # Add order items with pricing details (prefetched in get_queryset)
+        context['order_items'] = list(order.items.all())
+        total_items = sum(item.quantity for item in context['order_items'])
         
         # Calculate additional metrics
         context['order_metrics'] = {
-            'total_items': sum(item.quantity for item in context['order_items']),
-            'preparation_time': self._calculate_preparation_time(order),
+            'total_items': total_items,
+            'preparation_time': self._calculate_preparation_time(total_items),
             'order_age': (timezone.now() - order.created_at).total_seconds() / 3600,  # hours
         }
         
-        # Add delivery information if available
-        if hasattr(order, 'delivery_assignment'):
-            context['delivery_info'] = order.delivery_assignment
+        # Add delivery information if available (joined in get_queryset)
+        delivery_assignment = getattr(order, 'delivery_assignment', None)
+        if delivery_assignment:
+            context['delivery_info'] = delivery_assignment
         
         # Add staff assignment information if available
         try:
@@ -246,11 +332,11 @@ class StoreOrderDetailView(StoreRequiredMixin, DetailView):
         
         return context
     
-    def _calculate_preparation_time(self, order):
-        """Calculate estimated preparation time based on order items"""
+    def _calculate_preparation_time(self, total_items):
+        """Calculate estimated preparation time based on the order's item quantity"""
         # This could be enhanced with actual preparation time data
         base_time = 15  # Base 15 minutes
-        item_time = sum(item.quantity for item in order.items.all()) * 2  # 2 minutes per item
+        item_time = total_items * 2  # 2 minutes per item
         return base_time + item_time
 
 
@@ -262,12 +348,9 @@ class StoreOrderStatusUpdateView(View):
     def post(self, request, order_number):
         try:
             # Get the store for the current user
-            try:
-                store = Store.objects.get(owner=request.user)
-            except Store.DoesNotExist:
-                store = Store.objects.filter(storestaff__user=request.user).first()
-                if not store:
-                    return JsonResponse({'success': False, 'message': 'Store not found'})
+            store = get_user_store(request)
+            if not store:
+                return JsonResponse({'success': False, 'message': 'Store not found'})
             
             # Get the order
             order = get_object_or_404(Order, order_number=order_number, store=store)
@@ -289,8 +372,8 @@ class StoreOrderStatusUpdateView(View):
             )
             
             if success:
-                # Get updated order data
-                order.refresh_from_db()
+                # The service updates this instance in place (status, including any
+                # auto-transition, and updated_at via save()), so no re-fetch is needed
                 return JsonResponse({
                     'success': True,
                     'message': message,
@@ -311,6 +394,20 @@ class StoreOrderStatusUpdateView(View):
             return JsonResponse({'success': False, 'message': str(e)})
 
 
+# Bulk action -> (required current status, new status, history note)
+BULK_ORDER_ACTIONS = {
+    'confirm_orders': ('placed', 'confirmed', 'Bulk confirmation by store'),
+    'start_preparing': ('confirmed', 'preparing', 'Bulk status update - started preparing'),
+    'mark_packed': ('preparing', 'packed', 'Bulk status update - marked as packed'),
+    'mark_ready': ('packed', 'ready_for_pickup', 'Bulk status update - ready for pickup'),
+}
+
+# Moving into these statuses has per-order side effects in Order.save() and
+# OrderStatusService (delivery agent auto-assignment, handover codes), so they
+# still go through the service one order at a time
+ROW_BY_ROW_STATUSES = {'confirmed', 'packed'}
+
+
 @method_decorator(login_required, name='dispatch')
 @method_decorator(store_required, name='dispatch') 
 class StoreBulkOrderActionsView(View):
@@ -319,12 +416,9 @@ class StoreBulkOrderActionsView(View):
     def post(self, request):
         try:
             # Get the store for the current user
-            try:
-                store = Store.objects.get(owner=request.user)
-            except Store.DoesNotExist:
-                store = Store.objects.filter(storestaff__user=request.user).first()
-                if not store:
-                    return JsonResponse({'success': False, 'message': 'Store not found'})
+            store = get_user_store(request)
+            if not store:
+                return JsonResponse({'success': False, 'message': 'Store not found'})
             
             data = json.loads(request.body)
             action = data.get('action')
@@ -333,66 +427,65 @@ class StoreBulkOrderActionsView(View):
             if not action or not order_ids:
                 return JsonResponse({'success': False, 'message': 'Action and order IDs are required'})
             
-            # Get orders for this store only
-            orders = Order.objects.filter(id__in=order_ids, store=store)
+            # Get orders for this store only, in one query for both the check and the total
+            order_rows = list(
+                Order.objects.filter(id__in=order_ids, store=store).values_list('id', 'status')
+            )
             
-            if not orders.exists():
+            if not order_rows:
                 return JsonResponse({'success': False, 'message': 'No valid orders found'})
             
             success_count = 0
-            total_count = orders.count()
+            total_count = len(order_rows)
             
             # Handle different bulk actions
-            if action == 'confirm_orders':
-                for order in orders:
-                    if order.status == 'placed':
-                        success, _ = OrderStatusService.update_order_status(
-                            order=order,
-                            new_status='confirmed',
-                            updated_by=request.user,
-                            notes='Bulk confirmation by store'
-                        )
-                        if success:
-                            success_count += 1
-            
-            elif action == 'start_preparing':
-                for order in orders:
-                    if order.status == 'confirmed':
-                        success, _ = OrderStatusService.update_order_status(
-                            order=order,
-                            new_status='preparing',
-                            updated_by=request.user,
-                            notes='Bulk status update - started preparing'
-                        )
-                        if success:
-                            success_count += 1
+            if action not in BULK_ORDER_ACTIONS:
+                return JsonResponse({'success': False, 'message': 'Invalid action'})
             
-            elif action == 'mark_packed':
-                for order in orders:
-                    if order.status == 'preparing':
-                        success, _ = OrderStatusService.update_order_status(
-                            order=order,
-                            new_status='packed',
-                            updated_by=request.user,
-                            notes='Bulk status update - marked as packed'
-                        )
-                        if success:
-                            success_count += 1
+            from_status, to_status, notes = BULK_ORDER_ACTIONS[action]
+            eligible_ids = [order_id for order_id, status in order_rows if status == from_status]
+            if not eligible_ids:
+                return JsonResponse({
+                    'success': True,
+                    'message': f'Successfully updated 0 of {total_count} orders'
+                })
             
-            elif action == 'mark_ready':
-                for order in orders:
-                    if order.status == 'packed':
-                        success, _ = OrderStatusService.update_order_status(
-                            order=order,
-                            new_status='ready_for_pickup',
-                            updated_by=request.user,
-                            notes='Bulk status update - ready for pickup'
-                        )
-                        if success:
-                            success_count += 1
+            # Status is re-checked in SQL in case it changed since the rows were read
+            eligible = Order.objects.filter(id__in=eligible_ids, status=from_status)
             
+            if to_status in ROW_BY_ROW_STATUSES:
+                # Stream the batch so memory stays bounded however many IDs were posted
+                for order in eligible.iterator(chunk_size=200):
+                    success, _ = OrderStatusService.update_order_status(
+                        order=order,
+                        new_status=to_status,
+                        updated_by=request.user,
+                        notes=notes
+                    )
+                    if success:
+                        success_count += 1
             else:
-                return JsonResponse({'success': False, 'message': 'Invalid action'})
+                # Same checks as OrderStatusService, applied to the whole batch at once
+                if to_status in OrderStatusService.PAYMENT_REQUIRED_STATUSES:
+                    eligible = eligible.filter(Q(payment_status='paid') | Q(payment_method='cod'))
+                
+                with transaction.atomic():
+                    updated_ids = list(eligible.select_for_update().values_list('id', flat=True))
+                    success_count = Order.objects.filter(id__in=updated_ids).update(
+                        status=to_status,
+                        updated_at=timezone.now()
+                    )
+                    OrderStatusHistory.objects.bulk_create([
+                        OrderStatusHistory(
+                            order_id=order_id,
+                            status=to_status,
+                            notes=notes,
+                            updated_by=request.user
+                        )
+                        for order_id in updated_ids
+                    ])
+                # update() bypasses Order.save(), so clear the store's cached figures here
+                clear_store_order_caches(store.id)
             
             return JsonResponse({
                 'success': True,
@@ -407,26 +500,29 @@ class StoreBulkOrderActionsView(View):
 
 @login_required
 @store_required
+@cache_control(max_age=15, private=True)
+@vary_on_cookie
 def store_order_analytics_api(request):
     """API endpoint for store order analytics"""
     try:
-        # Get the store for the current user
-        try:
-            store = Store.objects.get(owner=request.user)
-        except Store.DoesNotExist:
-            store = Store.objects.filter(storestaff__user=request.user).first()
-            if not store:
-                return JsonResponse({'success': False, 'message': 'Store not found'})
+        # Store resolved by @store_required
+        store = request.store
+        if not store:
+            return JsonResponse({'success': False, 'message': 'Store not found'})
         
         # Get date range from query parameters
         date_from = request.GET.get('date_from')
         date_to = request.GET.get('date_to')
         
-        # Parse dates if provided
-        if date_from:
-            date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
-        if date_to:
-            date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
+        # Parse dates if provided (YYYY-MM-DD)
+        try:
+            date_from = date.fromisoformat(date_from) if date_from else None
+            date_to = date.fromisoformat(date_to) if date_to else None
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'message': 'Dates must be in YYYY-MM-DD format'
+            }, status=400)
         
         # Get analytics data for the store
         stats = OrderAnalyticsService.get_order_stats(
@@ -436,12 +532,6 @@ def store_order_analytics_api(request):
         )
         
         # Add store-specific metrics
-        orders_query = Order.objects.filter(store=store)
-        if date_from:
-            orders_query = orders_query.filter(created_at__gte=date_from)
-        if date_to:
-            orders_query = orders_query.filter(created_at__lte=date_to)
-        
         stats['store_metrics'] = {
             'avg_preparation_time': 25,  # Could be calculated from actual data
             'customer_satisfaction': 4.2,  # Could be from ratings
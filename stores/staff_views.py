@@ -4,23 +4,37 @@ from django.contrib.auth import get_user_model
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, TemplateView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.contrib.auth.hashers import make_password
 from django.http import JsonResponse, Http404
+from django.core.exceptions import ValidationError
 from django.views import View
 from django.utils import timezone
-from django.db.models import Count, Q
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 import random
 import string
 
 from core.decorators import StoreRequiredMixin
 from .models import Store, StoreStaff, StaffOrderAssignment
 from .forms import StoreStaffCreateForm
-from orders.models import Order
+from .tasks import finalize_delivery_assignment
+from orders.models import (
+    Order, OrderItem, ORDER_SAVE_HOOK_STATUSES, STORE_ORDER_KPIS_CACHE_KEY, clear_store_order_caches
+)
 from delivery.models import DeliveryAgent, DeliveryAssignment
 
 User = get_user_model()
 
+# Map order status to staff assignment status
+STATUS_MAPPING = {
+    'confirmed': 'accepted',
+    'processing': 'in_progress',
+    'ready': 'packed',
+    'out_for_delivery': 'ready_for_delivery'
+}
+
 class StaffManagementView(StoreRequiredMixin, ListView):
     """Store owner can view and manage all staff members"""
     template_name = 'stores/staff/staff_list.html'
@@ -35,7 +49,12 @@ class StaffManagementView(StoreRequiredMixin, ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['store'] = Store.objects.filter(owner=self.request.user).first()
+        # Staff rows already join their store; only query it when there are no staff
+        staff_members = context['staff_members']
+        if staff_members:
+            context['store'] = staff_members[0].store
+        else:
+            context['store'] = Store.objects.filter(owner=self.request.user).first()
         return context
 
 class StaffCreateView(StoreRequiredMixin, CreateView):
@@ -44,16 +63,22 @@ class StaffCreateView(StoreRequiredMixin, CreateView):
     form_class = StoreStaffCreateForm
     success_url = reverse_lazy('stores:staff_list')
     
+    def get_store(self):
+        """Owner's store, looked up once per request (form kwargs and form_valid share it)"""
+        if not hasattr(self, '_store'):
+            self._store = Store.objects.filter(owner=self.request.user).only('id').first()
+        return self._store
+    
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs['store'] = Store.objects.filter(owner=self.request.user).first()
+        kwargs['store'] = self.get_store()
         return kwargs
     
     def form_valid(self, form):
         try:
             with transaction.atomic():
                 # Get store
-                store = Store.objects.filter(owner=self.request.user).first()
+                store = self.get_store()
                 if not store:
                     messages.error(self.request, 'Store not found.')
                     return self.form_invalid(form)
@@ -62,28 +87,31 @@ class StaffCreateView(StoreRequiredMixin, CreateView):
                 username = f"staff_{store.id}_{form.cleaned_data['staff_id']}"
                 email = form.cleaned_data['email']
                 
-                # Check if user already exists
-                if User.objects.filter(email=email).exists():
+                # Check if user already exists (email or username, in one query)
+                clashing_emails = list(User.objects.filter(
+                    Q(email=email) | Q(username=username)
+                ).values_list('email', flat=True)[:2])
+                
+                if email in clashing_emails:
                     messages.error(self.request, 'A user with this email already exists.')
                     return self.form_invalid(form)
                 
-                if User.objects.filter(username=username).exists():
+                if clashing_emails:
                     messages.error(self.request, 'A staff member with this ID already exists.')
                     return self.form_invalid(form)
                 
-                # Create user without setting password (unusable password)
+                # Create user with an unusable password in a single INSERT -
+                # staff will set it on first login
                 user = User.objects.create(
                     username=username,
                     email=email,
+                    password=make_password(None),
                     first_name=form.cleaned_data['first_name'],
                     last_name=form.cleaned_data['last_name'],
                     user_type='store_staff',
                     phone_number=form.cleaned_data.get('phone_number'),
                     is_active=True
                 )
-                # Set unusable password - staff will set it on first login
-                user.set_unusable_password()
-                user.save()
                 
                 # Create staff profile
                 staff = StoreStaff.objects.create(
@@ -135,20 +163,16 @@ class StaffDeleteView(StoreRequiredMixin, DeleteView):
     
     def get_queryset(self):
         """Only allow deleting staff from the owner's store"""
-        return StoreStaff.objects.filter(store__owner=self.request.user)
+        return StoreStaff.objects.filter(store__owner=self.request.user).select_related('user')
     
-    def delete(self, request, *args, **kwargs):
+    def form_valid(self, form):
         """Soft delete - deactivate instead of deleting"""
-        self.object = self.get_object()
-        
-        # Deactivate staff and user
-        self.object.is_active = False
-        self.object.save()
-        
-        self.object.user.is_active = False
-        self.object.user.save()
+        # Deactivate staff and user with narrow UPDATEs instead of full-row saves
+        with transaction.atomic():
+            StoreStaff.objects.filter(pk=self.object.pk).update(is_active=False, updated_at=timezone.now())
+            User.objects.filter(pk=self.object.user_id).update(is_active=False, updated_at=timezone.now())
         
-        messages.success(request, f'Staff member {self.object.user.get_full_name()} has been deactivated.')
+        messages.success(self.request, f'Staff member {self.object.user.get_full_name()} has been deactivated.')
         return redirect(self.success_url)
 
 # =================
@@ -165,32 +189,41 @@ class StoreStaffRequiredMixin(LoginRequiredMixin):
             messages.error(request, 'You do not have permission to access this page.')
             return redirect('accounts:login')
         
+        # Resolve the staff profile and store once so the view methods don't re-query them
+        request.staff_profile = None
+        request.store = None
+        if request.user.user_type == 'store_staff':
+            request.staff_profile = StoreStaff.objects.select_related('store').filter(
+                user=request.user, is_active=True
+            ).first()
+            if request.staff_profile:
+                request.store = request.staff_profile.store
+        else:
+            request.store = Store.objects.filter(owner=request.user).first()
+        
         return super().dispatch(request, *args, **kwargs)
 
 class StaffDashboardView(StoreStaffRequiredMixin, TemplateView):
     """Dashboard for store staff members"""
     template_name = 'stores/staff/dashboard.html'
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    def get(self, request, *args, **kwargs):
+        if request.user.user_type == 'store_staff' and not request.staff_profile:
+            messages.error(request, 'Staff profile not found. Please contact your store manager.')
+            return redirect('accounts:login')
         
-        # Get staff profile and store
-        staff_profile = None
-        store = None
+        if not request.store:
+            messages.error(request, 'Store not found.')
+            return redirect('accounts:login')
         
-        if self.request.user.user_type == 'store_staff':
-            try:
-                staff_profile = StoreStaff.objects.get(user=self.request.user, is_active=True)
-                store = staff_profile.store
-            except StoreStaff.DoesNotExist:
-                messages.error(self.request, 'Staff profile not found. Please contact your store manager.')
-                return redirect('accounts:login')
-        elif self.request.user.user_type == 'store_owner':
-            store = Store.objects.filter(owner=self.request.user).first()
+        return super().get(request, *args, **kwargs)
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
         
-        if not store:
-            messages.error(self.request, 'Store not found.')
-            return redirect('accounts:login')
+        # Staff profile and store were resolved in dispatch
+        staff_profile = self.request.staff_profile
+        store = self.request.store
         
         # Get staff assignments if staff member
         assigned_orders = []
@@ -198,115 +231,123 @@ class StaffDashboardView(StoreStaffRequiredMixin, TemplateView):
             assigned_orders = StaffOrderAssignment.objects.filter(
                 staff=staff_profile,
                 status__in=['assigned', 'accepted', 'in_progress']
-            ).select_related('order').order_by('-assigned_at')[:10]
+            ).select_related('order__user').defer(
+                # Free-text and JSON order columns the dashboard never renders
+                'notes', 'order__delivery_instructions', 'order__payment_details',
+                'order__customer_notes', 'order__store_notes'
+            ).order_by('-assigned_at')[:10]
         
-        # Get store order statistics
-        today = timezone.now().date()
-        store_orders = Order.objects.filter(store=store)
+        # Get store order statistics in a single conditional aggregate, cached briefly
+        def load_order_stats():
+            today = timezone.now().date()
+            return Order.objects.filter(store=store).aggregate(
+                total_orders_today=Count('id', filter=Q(created_at__date=today)),
+                pending_orders=Count('id', filter=Q(status='pending')),
+                processing_orders=Count('id', filter=Q(status='confirmed')),
+                ready_orders=Count('id', filter=Q(status='ready')),
+            )
+        order_stats = cache.get_or_set(
+            STORE_ORDER_KPIS_CACHE_KEY.format(store_id=store.id),
+            load_order_stats,
+            timeout=30
+        )
         
         context.update({
             'staff_profile': staff_profile,
             'store': store,
             'assigned_orders': assigned_orders,
-            'total_orders_today': store_orders.filter(created_at__date=today).count(),
-            'pending_orders': store_orders.filter(status='pending').count(),
-            'processing_orders': store_orders.filter(status='confirmed').count(),
-            'ready_orders': store_orders.filter(status='ready').count(),
+            **order_stats,
         })
         
         return context
 
-class StaffOrdersView(StoreStaffRequiredMixin, ListView):
+class StaffQuerySetMixin:
+    """Applies a view's staff_select_related join set to its base queryset"""
+    staff_select_related = ()
+    
+    def get_queryset(self):
+        return super().get_queryset().select_related(*self.staff_select_related)
+
+class StaffOrdersView(StaffQuerySetMixin, StoreStaffRequiredMixin, ListView):
     """View for staff to see their assigned orders"""
+    model = StaffOrderAssignment
     template_name = 'stores/staff/orders.html'
     context_object_name = 'assignments'
     paginate_by = 20
+    staff_select_related = ('order__user', 'staff__user')
     
     def get_queryset(self):
-        if self.request.user.user_type == 'store_staff':
-            try:
-                staff_profile = StoreStaff.objects.get(user=self.request.user, is_active=True)
-                return StaffOrderAssignment.objects.filter(
-                    staff=staff_profile
-                ).select_related('order', 'order__user').order_by('-assigned_at')
-            except StoreStaff.DoesNotExist:
-                return StaffOrderAssignment.objects.none()
-        elif self.request.user.user_type == 'store_owner':
-            store = Store.objects.filter(owner=self.request.user).first()
-            if store:
-                return StaffOrderAssignment.objects.filter(
-                    staff__store=store
-                ).select_related('order', 'staff__user').order_by('-assigned_at')
-        return StaffOrderAssignment.objects.none()
+        if self.request.user.user_type == 'store_staff' and self.request.staff_profile:
+            assignments = super().get_queryset().filter(staff=self.request.staff_profile)
+        elif self.request.user.user_type == 'store_owner' and self.request.store:
+            assignments = super().get_queryset().filter(staff__store=self.request.store)
+        else:
+            return StaffOrderAssignment.objects.none()
+        
+        # Count line items in a subquery and load only the rendered columns,
+        # so a page costs one query however many rows it shows
+        item_count = OrderItem.objects.filter(order=OuterRef('order_id')).order_by().values('order').annotate(
+            count=Count('id')
+        ).values('count')
+        return assignments.only(
+            'status', 'assigned_at', 'order', 'staff',
+            'order__order_number', 'order__status', 'order__total_amount',
+            'order__user__first_name', 'order__user__last_name', 'order__user__phone_number',
+            'staff__role', 'staff__user__first_name', 'staff__user__last_name'
+        ).annotate(item_count=Coalesce(Subquery(item_count), 0)).order_by('-assigned_at')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        
-        # Get staff profile
-        staff_profile = None
-        if self.request.user.user_type == 'store_staff':
-            try:
-                staff_profile = StoreStaff.objects.get(user=self.request.user, is_active=True)
-            except StoreStaff.DoesNotExist:
-                pass
-        
-        context['staff_profile'] = staff_profile
+        context['staff_profile'] = self.request.staff_profile
         return context
 
-class StaffOrderDetailView(StoreStaffRequiredMixin, DetailView):
+class StaffOrderDetailView(StaffQuerySetMixin, StoreStaffRequiredMixin, DetailView):
     """Detailed view of an order for staff - Only assigned orders"""
+    model = Order
     template_name = 'stores/staff/order_detail.html'
     context_object_name = 'order'
+    staff_select_related = (
+        'store', 'user', 'delivery_address',
+        'staff_assignment__staff__user', 'delivery_assignment__agent__user'
+    )
     
     def get_object(self):
         order_number = self.kwargs['order_number']
-        order = get_object_or_404(Order, order_number=order_number)
+        orders = self.get_queryset()
         
-        # Check if staff has access to this order
+        # Scope the lookup to what the user may see, so access is checked in the same query
         if self.request.user.user_type == 'store_staff':
             # Staff can only see orders assigned to them
-            try:
-                staff_profile = StoreStaff.objects.get(user=self.request.user, is_active=True)
-                staff_assignment = StaffOrderAssignment.objects.get(order=order, staff=staff_profile)
-            except (StoreStaff.DoesNotExist, StaffOrderAssignment.DoesNotExist):
+            staff_profile = self.request.staff_profile
+            order = orders.filter(
+                staff_assignment__staff=staff_profile, order_number=order_number
+            ).first() if staff_profile else None
+            if order is None:
                 messages.error(self.request, 'You can only view orders that are assigned to you.')
                 raise Http404("Order not found or not assigned to you.")
-        elif self.request.user.user_type == 'store_owner':
+            return order
+        
+        if self.request.user.user_type == 'store_owner':
             # Store owners can see any order from their store
-            try:
-                store = Store.objects.get(owner=self.request.user)
-                if order.store != store:
-                    raise Http404("Order not found in your store.")
-            except Store.DoesNotExist:
+            if not self.request.store:
                 raise Http404("Store not found.")
+            orders = orders.filter(store=self.request.store)
         
-        return order
+        return get_object_or_404(orders, order_number=order_number)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        order = self.get_object()
+        order = self.object
         
-        # Get staff assignment if exists
-        try:
-            staff_assignment = StaffOrderAssignment.objects.get(order=order)
-            context['staff_assignment'] = staff_assignment
-        except StaffOrderAssignment.DoesNotExist:
-            context['staff_assignment'] = None
+        # Staff assignment (if any) was joined in get_object
+        context['staff_assignment'] = getattr(order, 'staff_assignment', None)
         
         # Get available delivery agents
-        delivery_agents = DeliveryAgent.objects.filter(
-            status='active', 
-            is_available=True
-        ).select_related('user')
-        context['delivery_agents'] = delivery_agents
+        context['delivery_agents'] = DeliveryAgent.get_available_agents()
         
-        # Get current delivery assignment if exists
-        try:
-            delivery_assignment = DeliveryAssignment.objects.get(order=order)
-            context['delivery_assignment'] = delivery_assignment
-        except DeliveryAssignment.DoesNotExist:
-            context['delivery_assignment'] = None
+        # Current delivery assignment (if any) was joined in get_object
+        context['delivery_assignment'] = getattr(order, 'delivery_assignment', None)
         
         return context
 
@@ -319,40 +360,31 @@ class StaffUpdateOrderStatusView(StoreStaffRequiredMixin, View):
             new_status = request.POST.get('status')
             notes = request.POST.get('notes', '')
             
-            order = get_object_or_404(Order, id=order_id)
-            
-            # Update order status
-            order.status = new_status
-            order.save()
+            # Update order status - a single-column UPDATE unless save() has work to do
+            if new_status in ORDER_SAVE_HOOK_STATUSES:
+                order = get_object_or_404(Order, id=order_id)
+                order.status = new_status
+                order.save()
+            else:
+                order = get_object_or_404(Order.objects.only('id', 'store_id'), id=order_id)
+                Order.objects.filter(pk=order.pk).update(status=new_status, updated_at=timezone.now())
+                # update() bypasses Order.save(), so clear the store's cached figures here
+                clear_store_order_caches(order.store_id)
             
             # Update staff assignment status if exists
-            try:
-                staff_assignment = StaffOrderAssignment.objects.get(order=order)
-                
-                # Map order status to assignment status
-                status_mapping = {
-                    'confirmed': 'accepted',
-                    'processing': 'in_progress',
-                    'ready': 'packed',
-                    'out_for_delivery': 'ready_for_delivery'
-                }
-                
-                if new_status in status_mapping:
-                    staff_assignment.status = status_mapping[new_status]
-                    if notes:
-                        staff_assignment.notes = notes
-                    staff_assignment.save()
-                
-            except StaffOrderAssignment.DoesNotExist:
-                pass
+            if new_status in STATUS_MAPPING:
+                assignment_updates = {'status': STATUS_MAPPING[new_status], 'updated_at': timezone.now()}
+                if notes:
+                    assignment_updates['notes'] = notes
+                StaffOrderAssignment.objects.filter(order_id=order.id).update(**assignment_updates)
             
             return JsonResponse({
                 'success': True,
                 'message': f'Order status updated to {new_status}',
-                'order_status': order.status
+                'order_status': new_status
             })
             
-        except Exception as e:
+        except (Http404, ValueError, IntegrityError, ValidationError) as e:
             return JsonResponse({
                 'success': False,
                 'error': str(e)
@@ -366,54 +398,44 @@ class StaffAssignDeliveryAgentView(StoreStaffRequiredMixin, View):
             order_id = request.POST.get('order_id')
             agent_id = request.POST.get('agent_id')
             
-            order = get_object_or_404(Order, id=order_id)
-            agent = get_object_or_404(DeliveryAgent, id=agent_id)
+            agent = get_object_or_404(DeliveryAgent.objects.select_related('user'), id=agent_id)
             
-            # Verify staff has access to this order
-            if request.user.user_type == 'store_staff':
-                staff_assignment = get_object_or_404(
-                    StaffOrderAssignment, 
-                    order=order, 
-                    staff__user=request.user
-                )
-            
-            # Create or update delivery assignment
-            assignment, created = DeliveryAssignment.objects.get_or_create(
-                order=order,
-                defaults={
-                    'agent': agent,
-                    'assigned_by': request.user,
-                    'status': 'assigned',
-                    'pickup_address': order.store.address
-                }
-            )
-            
-            if not created:
-                assignment.agent = agent
-                assignment.assigned_by = request.user
-                assignment.status = 'assigned'
-                assignment.save()
-            
-            # Update order status to out_for_delivery
-            if order.status == 'ready':
-                order.status = 'out_for_delivery'
-                order.save()
+            # All writes commit together, with the order row locked against concurrent status changes
+            with transaction.atomic():
+                order = get_object_or_404(Order.objects.select_for_update(), id=order_id)
                 
-                # Update staff assignment status
+                # Verify staff has access to this order
                 if request.user.user_type == 'store_staff':
-                    staff_assignment = StaffOrderAssignment.objects.filter(order=order).first()
-                    if staff_assignment:
-                        staff_assignment.status = 'ready_for_delivery'
-                        staff_assignment.save()
+                    if not StaffOrderAssignment.objects.filter(order=order, staff__user=request.user).exists():
+                        raise Http404("Order not assigned to you.")
+                
+                # Create or update delivery assignment (assigned_at is auto-set on create)
+                assignment, created = DeliveryAssignment.objects.update_or_create(
+                    order=order,
+                    defaults={
+                        'agent': agent,
+                        'status': 'assigned',
+                        'assigned_at': timezone.now()
+                    }
+                )
+                
+                # Status follow-up (order out for delivery, staff assignment flip) runs
+                # in the background once the assignment has committed
+                follow_up = order.status == 'ready'
+                if follow_up:
+                    update_staff_assignment = request.user.user_type == 'store_staff'
+                    transaction.on_commit(lambda: finalize_delivery_assignment.delay(
+                        order.id, order.store_id, update_staff_assignment
+                    ))
             
             return JsonResponse({
                 'success': True,
                 'message': f'Delivery agent {agent.user.get_full_name()} assigned to order',
                 'agent_name': agent.user.get_full_name(),
-                'order_status': order.status
-            })
+                'order_status': 'out_for_delivery' if follow_up else order.status
+            }, status=202 if follow_up else 200)
             
-        except Exception as e:
+        except (Http404, ValueError, IntegrityError, ValidationError) as e:
             return JsonResponse({
                 'success': False,
                 'error': str(e)
@@ -436,38 +458,28 @@ class AssignOrderToStaffView(StoreRequiredMixin, View):
             order_id = request.POST.get('order_id')
             staff_id = request.POST.get('staff_id')
             
-            order = get_object_or_404(Order, id=order_id)
-            staff = get_object_or_404(StoreStaff, id=staff_id)
-            
-            # Verify order belongs to the manager's store
-            store = Store.objects.get(owner=request.user)
-            if order.store != store:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Order does not belong to your store'
-                })
-            
-            # Create or update staff assignment
-            assignment, created = StaffOrderAssignment.objects.get_or_create(
-                order=order,
-                defaults={
-                    'staff': staff,
-                    'assigned_by': request.user,
-                    'status': 'assigned'
-                }
-            )
+            # Both lookups are scoped to the manager's store, which also verifies ownership
+            staff = get_object_or_404(StoreStaff.objects.select_related('user'), id=staff_id, store__owner=request.user)
             
-            if not created:
-                assignment.staff = staff
-                assignment.assigned_by = request.user
-                assignment.status = 'assigned'
-                assignment.assigned_at = timezone.now()
-                assignment.save()
-            
-            # Update order status to confirmed if it was pending
-            if order.status == 'pending':
-                order.status = 'confirmed'
-                order.save()
+            # Assignment and status change commit together, with the order row locked
+            with transaction.atomic():
+                order = get_object_or_404(Order.objects.select_for_update(of=('self',)), id=order_id, store__owner=request.user)
+                
+                # Create or update staff assignment (assigned_at is auto-set on create)
+                assignment, created = StaffOrderAssignment.objects.update_or_create(
+                    order=order,
+                    defaults={
+                        'staff': staff,
+                        'assigned_by': request.user,
+                        'status': 'assigned',
+                        'assigned_at': timezone.now()
+                    }
+                )
+                
+                # Update order status to confirmed if it was pending
+                if order.status == 'pending':
+                    order.status = 'confirmed'
+                    order.save()
             
             return JsonResponse({
                 'success': True,
@@ -476,7 +488,7 @@ class AssignOrderToStaffView(StoreRequiredMixin, View):
                 'order_status': order.status
             })
             
-        except Exception as e:
+        except (Http404, ValueError, IntegrityError, ValidationError) as e:
             return JsonResponse({
                 'success': False,
                 'error': str(e)
@@ -0,0 +1,69 @@
+"""
+Store Background Tasks
+Follow-up writes for staff order actions and product CSV imports, run off the request path
+"""
+import logging
+from celery import shared_task
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from orders.models import Order, clear_store_order_caches
+from stores.models import StaffOrderAssignment, Store
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def finalize_delivery_assignment(order_id, store_id, update_staff_assignment=False):
+    """Send a ready order out for delivery once its delivery agent is assigned"""
+    # Conditional UPDATE, so a repeated or late run never moves an order that has moved on
+    updated = Order.objects.filter(pk=order_id, status='ready').update(
+        status='out_for_delivery',
+        updated_at=timezone.now()
+    )
+    if not updated:
+        logger.info(f"Order {order_id} was no longer ready; delivery assignment follow-up skipped")
+        return
+
+    if update_staff_assignment:
+        StaffOrderAssignment.objects.filter(order_id=order_id).update(
+            status='ready_for_delivery',
+            updated_at=timezone.now()
+        )
+
+    # update() bypasses Order.save(), so clear the store's cached figures here
+    clear_store_order_caches(store_id)
+
+
+@shared_task(ignore_result=True)
+def import_products_csv(job_id, store_id, file_path):
+    """Import an uploaded product CSV for a store, recording progress under the job id"""
+    from stores.views_bulk_import import open_csv_reader, process_csv_rows, set_import_job
+
+    # Counts as of the last finished batch, kept for the failed state
+    reported = {'processed': 0, 'created': 0, 'updated': 0, 'errors': 0, 'error_details': []}
+
+    def report(results):
+        reported.update(results)
+        set_import_job(job_id, store_id, state='running', **results)
+
+    try:
+        store = Store.objects.get(pk=store_id)
+        set_import_job(job_id, store_id, state='running')
+        with default_storage.open(file_path, 'rb') as csv_file:
+            results = process_csv_rows(open_csv_reader(csv_file), store, progress=report)
+        set_import_job(
+            job_id, store_id, state='done', details=results,
+            message=f'Import completed: {results["created"]} created, {results["updated"]} updated, {results["errors"]} errors',
+            **results
+        )
+    except Exception as e:
+        logger.exception(f"Bulk import {job_id} for store {store_id} failed")
+        # Batches committed before the failure stay imported; say so in the final state
+        set_import_job(
+            job_id, store_id, state='failed', details=reported,
+            message=f'Error processing CSV after {reported["processed"]} rows '
+                    f'({reported["created"]} created, {reported["updated"]} updated): {str(e)}',
+            **reported
+        )
+    finally:
+        default_storage.delete(file_path)
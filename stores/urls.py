@@ -1,5 +1,5 @@
 from django.urls import path
-from django.shortcuts import redirect
+from django.views.generic import RedirectView
 from . import views
 from . import views_bulk_import
 from . import views_additional
@@ -13,7 +13,7 @@ app_name = 'stores'
 
 urlpatterns = [
     # Redirect store listing to home (Blinkit-style - no store selection for users)
-    path('', lambda request: redirect('core:home'), name='store_list'),
+    path('', RedirectView.as_view(pattern_name='core:home', permanent=False), name='store_list'),
     
     # Store management for store owners - Updated URL names to match dashboard templates
     path('dashboard/', views.StoreDashboardView.as_view(), name='dashboard'),
@@ -53,8 +53,6 @@ urlpatterns = [
     path('api/staff/update-order-status/', staff_views.StaffUpdateOrderStatusView.as_view(), name='staff_update_order_status'),
     path('api/staff/assign-delivery/', staff_views.StaffAssignDeliveryAgentView.as_view(), name='staff_assign_delivery'),
     path('api/assign-order-to-staff/', staff_views.AssignOrderToStaffView.as_view(), name='assign_order_to_staff'),
-    path('api/staff/update-order-status/', staff_views.StaffUpdateOrderStatusView.as_view(), name='staff_update_order_status'),
-    path('api/assign-order-to-staff/', staff_views.AssignOrderToStaffView.as_view(), name='assign_order_to_staff'),
     
     # Additional store management URLs
     path('profile/', views_additional.store_profile, name='store_profile'),
@@ -65,6 +63,7 @@ urlpatterns = [
     # Bulk Import System
     path('bulk-import/', views_bulk_import.bulk_import_products, name='bulk_import'),
     path('bulk-import/validate/', views_bulk_import.validate_csv_data, name='validate_csv'),
+    path('bulk-import/status/<str:job_id>/', views_bulk_import.import_status, name='import_status'),
     path('bulk-import/history/', views_bulk_import.import_history, name='import_history'),
     path('bulk-import/sample-csv/', views_bulk_import.download_sample_csv, name='sample_csv'),
     
@@ -4,15 +4,118 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.urls import reverse_lazy
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.core.cache import cache
+from django.views.decorators.cache import cache_control
+from django.views.decorators.vary import vary_on_cookie
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.utils import timezone
-from django.db.models import Q, Count
-from .models import Store, StoreClosureRequest, StoreStaff
-from catalog.models import StoreProduct
-from orders.models import Order
-from delivery.models import DeliveryAgent
-from core.decorators import StoreRequiredMixin, store_required
+from django.db import DatabaseError, transaction
+from django.db.models import Case, Count, Max, OuterRef, Prefetch, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from .models import Store, StoreClosureRequest, StoreStaff, StoreZipCoverage, STORE_DASHBOARD_STATS_CACHE_KEY
+from catalog.models import StoreProduct, STORE_PRODUCT_COUNT_CACHE_KEY
+from orders.models import (
+    Order, OrderItem, ORDER_SAVE_HOOK_STATUSES, ORDER_STATUS_UPDATE_FIELDS, PENDING_ORDER_STATUSES,
+    STORE_NEW_ORDERS_CACHE_KEY, clear_store_order_caches
+)
+from delivery.models import DeliveryAgent, DeliveryAgentZipCoverage
+from core.decorators import StoreRequiredMixin, get_user_store, store_required
+from core.pagination import CachedCountPaginator
+import hashlib
 import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_PAGE_SIZE = 25
+
+# Order status codes, bound once at import instead of resolving the field per request
+ORDER_STATUS_CHOICES = Order.ORDER_STATUS
+VALID_ORDER_STATUSES = [code for code, _ in ORDER_STATUS_CHOICES]
+
+# Store columns read by the dashboard and the status endpoints (is_open needs business_hours)
+STORE_SUMMARY_FIELDS = ('id', 'name', 'store_code', 'status', 'business_hours', 'updated_at')
+
+# Order and customer columns read by the order listings
+ORDER_LIST_FIELDS = (
+    'id', 'order_number', 'status', 'total_amount', 'created_at',
+    'user__username', 'user__first_name', 'user__last_name'
+)
+
+# StoreProduct columns needed by the inventory listings
+INVENTORY_LIST_FIELDS = (
+    'id', 'store_id', 'product_id', 'price', 'stock_quantity', 'is_available', 'is_featured',
+    'product__name', 'product__image', 'product__category__name',
+)
+
+def _store_page_etag(request, *versions):
+    """
+    ETag for a read-only store page: the store row's version, the query string and
+    the given data versions. The CSRF cookie is mixed in so a cached form never
+    replays a stale token, and pages with pending flash messages are always rendered
+    """
+    store = request.store
+    if request.method != 'GET' or store is None or len(messages.get_messages(request)):
+        return None
+    parts = (store.id, store.updated_at.timestamp(), request.META.get('CSRF_COOKIE', ''),
+             request.GET.urlencode(), *versions)
+    return hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+def _inventory_etag(request):
+    """Changes whenever one of the store's products is added, edited or removed"""
+    if request.store is None:
+        return None
+    products = StoreProduct.objects.filter(store=request.store).aggregate(
+        last_change=Max('updated_at'), count=Count('id')
+    )
+    return _store_page_etag(request, products['last_change'], products['count'])
+
+def _delivery_agents_etag(request):
+    """Changes with the agents version, which agent and coverage writes reset"""
+    return _store_page_etag(request, DeliveryAgent.get_cache_version())
+
+def _store_agents_q(store, served_zip_ids):
+    """
+    Agents assigned to the store or serving one of its ZIP areas. The coverage side
+    is an id__in subquery rather than a join, so results need no DISTINCT.
+    served_zip_ids should be a materialised list; with no served areas only the
+    store's own agents match
+    """
+    if not served_zip_ids:
+        return Q(store=store)
+    covering_agents = DeliveryAgentZipCoverage.objects.filter(
+        zip_area_id__in=served_zip_ids,
+        is_active=True
+    ).values('agent_id')
+    return Q(store=store) | Q(id__in=covering_agents)
+
+def _store_count(queryset, **filters):
+    """Correlated COUNT of the queryset's rows that belong to the outer Store row"""
+    return Coalesce(Subquery(
+        queryset.filter(store=OuterRef('pk'), **filters).order_by()
+        .values('store').annotate(total=Count('pk')).values('total')
+    ), 0)
+
+def _compute_dashboard_stats(store):
+    """Product, pending order and staff counts for the store dashboard, in one query"""
+    return Store.objects.filter(pk=store.pk).annotate(
+        total_products=_store_count(StoreProduct.objects),
+        active_products=_store_count(StoreProduct.objects, is_available=True),
+        low_stock_count=_store_count(StoreProduct.objects, stock_quantity__lt=10),
+        pending_orders_count=_store_count(Order.objects, status__in=PENDING_ORDER_STATUSES),
+        staff_count=_store_count(StoreStaff.objects, is_active=True),
+    ).values(
+        'total_products', 'active_products', 'low_stock_count', 'pending_orders_count', 'staff_count'
+    ).get()
+
+def _get_dashboard_stats(store):
+    """Dashboard counts cached for a minute; Order and StoreProduct writes clear the entry"""
+    return cache.get_or_set(
+        STORE_DASHBOARD_STATS_CACHE_KEY.format(store_id=store.id),
+        lambda: _compute_dashboard_stats(store),
+        60
+    )
 
 # Note: We don't show store lists to users anymore (Blinkit-style automatic selection)
 # These views are mainly for store owners to manage their stores
@@ -24,69 +127,57 @@ class StoreDashboardView(StoreRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Get stores owned by current user
-        user_stores = Store.objects.filter(owner=self.request.user)
+        # The current user's store (owned or staffed), resolved once per request
+        store = get_user_store(self.request, STORE_SUMMARY_FIELDS)
         
-        if user_stores.exists():
-            # For now, get the first store (can be enhanced for multi-store owners)
-            store = user_stores.first()
+        if store is not None:
             context['store'] = store
             
-            # Get basic stats
-            context['total_products'] = StoreProduct.objects.filter(store=store).count()
-            context['active_products'] = StoreProduct.objects.filter(
-                store=store, 
-                is_available=True
-            ).count()
-            
-            # Get pending orders for dashboard
-            try:
-                from orders.models import Order
-                pending_orders = Order.objects.filter(
-                    delivery_agent__isnull=True,
-                    status='pending'
-                ).select_related('user')[:5]
-                context['pending_orders'] = pending_orders
-                context['pending_orders_count'] = Order.objects.filter(status='pending').count()
-            except:
-                context['pending_orders'] = []
-                context['pending_orders_count'] = 0
+            dashboard_stats = _get_dashboard_stats(store)
+            context['total_products'] = dashboard_stats['total_products']
+            context['active_products'] = dashboard_stats['active_products']
             
-            # Stats for the enhanced dashboard
-            # Determine available delivery agents for this store: either assigned to the store
-            # or those who serve any of the store's active ZIP areas.
-            served_zip_areas = store.zip_coverages.filter(is_active=True).values_list('zip_area', flat=True)
-            agents_qs = DeliveryAgent.objects.filter(
-                Q(store=store) | Q(zip_coverages__zip_area__in=served_zip_areas, zip_coverages__is_active=True),
-                is_available=True
-            ).distinct()
-
             # If the store is closed, we shouldn't show pending orders or available agents
             if store.status != 'open':
                 pending_orders = []
                 pending_orders_count = 0
-                available_agents_count = 0
+                agents_qs = DeliveryAgent.objects.none()
+                available_agents = []
             else:
-                pending_orders = context.get('pending_orders', [])
-                pending_orders_count = context.get('pending_orders_count', 0)
-                available_agents_count = agents_qs.count()
+                # Available delivery agents for this store: either assigned to the store
+                # or those who serve any of the store's active ZIP areas.
+                served_zip_ids = list(StoreZipCoverage.objects.active_for(store).values_list('zip_area_id', flat=True))
+                agents_qs = DeliveryAgent.objects.filter(
+                    _store_agents_q(store, served_zip_ids),
+                    is_available=True
+                ).select_related('user')
+                
+                # Latest pending orders for this store; the count comes from the cached stats
+                pending_orders = list(
+                    Order.objects.filter(store=store, status__in=PENDING_ORDER_STATUSES)
+                    .select_related('user')
+                    .annotate(item_count=Count('items'))
+                    .order_by('-created_at')[:5]
+                )
+                pending_orders_count = dashboard_stats['pending_orders_count']
+                # Left lazy: the template only evaluates it when its cached fragment has expired
+                available_agents = agents_qs
+            context['pending_orders'] = pending_orders
+            context['pending_orders_count'] = pending_orders_count
 
             context['stats'] = {
                 'pending_orders': pending_orders_count,
-                'low_stock_count': StoreProduct.objects.filter(
-                    store=store, 
-                    stock_quantity__lt=10
-                ).count(),
-                'available_agents': available_agents_count,
-                'staff_count': StoreStaff.objects.filter(store=store, is_active=True).count(),
+                'low_stock_count': dashboard_stats['low_stock_count'],
+                'staff_count': dashboard_stats['staff_count'],
             }
             
             # Store status
             context['store_status'] = store.status
             context['is_store_open'] = store.is_open
             # Provide agents queryset and a simple list for templates
-            context['available_agents_qs'] = agents_qs if store.status == 'open' else DeliveryAgent.objects.none()
-            context['available_agents'] = list(agents_qs) if store.status == 'open' else []
+            context['available_agents_qs'] = agents_qs
+            context['available_agents'] = available_agents
+            context['agents_version'] = DeliveryAgent.get_cache_version()
             
         return context
 
@@ -96,9 +187,7 @@ class StoreProfileView(LoginRequiredMixin, TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user_stores = Store.objects.filter(owner=self.request.user)
-        if user_stores.exists():
-            context['store'] = user_stores.first()
+        context['store'] = get_user_store(self.request)
         return context
 
 class StoreProductsView(LoginRequiredMixin, ListView):
@@ -106,19 +195,25 @@ class StoreProductsView(LoginRequiredMixin, ListView):
     template_name = 'stores/products.html'
     context_object_name = 'products'
     paginate_by = 20
+    paginator_class = CachedCountPaginator
     
     def get_queryset(self):
-        user_stores = Store.objects.filter(owner=self.request.user)
-        if user_stores.exists():
-            store = user_stores.first()
-            return StoreProduct.objects.filter(store=store).select_related('product')
+        self.store = store = get_user_store(self.request)
+        if store is not None:
+            return StoreProduct.objects.filter(store=store).select_related(
+                'product__category'
+            ).only(*INVENTORY_LIST_FIELDS)
         return StoreProduct.objects.none()
     
+    def get_paginator(self, *args, **kwargs):
+        # The listing is always store-scoped, so the count is cached per store
+        if self.store is not None:
+            kwargs['count_cache_key'] = STORE_PRODUCT_COUNT_CACHE_KEY.format(store_id=self.store.id)
+        return super().get_paginator(*args, **kwargs)
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user_stores = Store.objects.filter(owner=self.request.user)
-        if user_stores.exists():
-            context['store'] = user_stores.first()
+        context['store'] = get_user_store(self.request)
         return context
 
 class StoreOrdersView(LoginRequiredMixin, ListView):
@@ -128,18 +223,15 @@ class StoreOrdersView(LoginRequiredMixin, ListView):
     paginate_by = 20
     
     def get_queryset(self):
-        user_stores = Store.objects.filter(owner=self.request.user)
-        if user_stores.exists():
-            store = user_stores.first()
+        store = get_user_store(self.request)
+        if store is not None:
             # Return orders for this store (will be implemented with Order model)
             return []
         return []
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user_stores = Store.objects.filter(owner=self.request.user)
-        if user_stores.exists():
-            context['store'] = user_stores.first()
+        context['store'] = get_user_store(self.request)
         return context
 
 class DeliveryAgentsView(LoginRequiredMixin, ListView):
@@ -148,19 +240,18 @@ class DeliveryAgentsView(LoginRequiredMixin, ListView):
     context_object_name = 'agents'
     
     def get_queryset(self):
-        user_stores = Store.objects.filter(owner=self.request.user)
-        if user_stores.exists():
-            store = user_stores.first()
+        store = get_user_store(self.request)
+        if store is not None:
             # If the store is closed, return no agents
             if store.status != 'open':
                 return DeliveryAgent.objects.none()
 
             # Return delivery agents assigned to the store or who serve the store's active ZIP areas
-            served_zip_areas = store.zip_coverages.filter(is_active=True).values_list('zip_area', flat=True)
+            served_zip_ids = list(StoreZipCoverage.objects.active_for(store).values_list('zip_area_id', flat=True))
             agents_qs = DeliveryAgent.objects.filter(
-                Q(store=store) | Q(zip_coverages__zip_area__in=served_zip_areas, zip_coverages__is_active=True),
+                _store_agents_q(store, served_zip_ids),
                 is_active=True
-            ).distinct().order_by('-is_available', 'user__last_name')
+            ).order_by('-is_available', 'user__last_name')
 
             return agents_qs
         return []
@@ -171,10 +262,8 @@ class ClosureRequestView(LoginRequiredMixin, FormView):
     success_url = reverse_lazy('stores:dashboard')
     
     def form_valid(self, form):
-        user_stores = Store.objects.filter(owner=self.request.user)
-        if user_stores.exists():
-            store = user_stores.first()
-            
+        store = get_user_store(self.request)
+        if store is not None:
             # Create closure request (simplified)
             StoreClosureRequest.objects.create(
                 store=store,
@@ -190,19 +279,16 @@ class StoreStatusAPIView(LoginRequiredMixin, TemplateView):
     """API to check store status"""
     
     def get(self, request, *args, **kwargs):
-        user_stores = Store.objects.filter(owner=request.user)
-        
-        if not user_stores.exists():
+        store = get_user_store(request, STORE_SUMMARY_FIELDS)
+        if store is None:
             return JsonResponse({'error': 'No store found'})
         
-        store = user_stores.first()
-        
         return JsonResponse({
             'store_id': store.id,
             'store_name': store.name,
             'status': store.status,
             'is_open': store.is_open,
-            'total_products': StoreProduct.objects.filter(store=store).count(),
+            'total_products': _get_dashboard_stats(store)['total_products'],
         })
 
 class ToggleProductAPIView(LoginRequiredMixin, TemplateView):
@@ -211,16 +297,14 @@ class ToggleProductAPIView(LoginRequiredMixin, TemplateView):
     def post(self, request, *args, **kwargs):
         product_id = request.POST.get('product_id')
         
-        user_stores = Store.objects.filter(owner=request.user)
-        if not user_stores.exists():
+        store = get_user_store(request)
+        if store is None:
             return JsonResponse({'error': 'No store found'})
         
-        store = user_stores.first()
-        
         try:
             store_product = StoreProduct.objects.get(id=product_id, store=store)
             store_product.is_available = not store_product.is_available
-            store_product.save()
+            store_product.save(update_fields=['is_available', 'updated_at'])
             
             return JsonResponse({
                 'success': True,
@@ -262,25 +346,19 @@ class UpdateInventoryView(TemplateView):
 
 # ================ NEW STORE DASHBOARD VIEWS ================
 
-@store_required
 @store_required
 def store_orders(request):
     """View for managing store orders - Only accessible by store owners and staff"""
-    # Get the store owned by current user
-    try:
-        if request.user.user_type == 'store_owner':
-            store = Store.objects.get(owner=request.user)
-        elif request.user.user_type == 'store_staff':
-            # Store staff should have access to their assigned store
-            store = Store.objects.get(storestaff__user=request.user)
-        else:
-            return render(request, 'stores/access_denied.html')
-    except Store.DoesNotExist:
+    # Store resolved by @store_required
+    store = request.store
+    if store is None:
         return render(request, 'stores/access_denied.html')
     
     # Get orders for this store
     status_filter = request.GET.get('status', '')
-    orders = Order.objects.filter(store=store)
+    orders = Order.objects.filter(store=store).select_related('user').only(
+        *ORDER_LIST_FIELDS
+    ).annotate(item_count=Count('items'))
     
     if status_filter:
         orders = orders.filter(status=status_filter)
@@ -291,7 +369,7 @@ def store_orders(request):
         'store': store,
         'orders': orders,
         'status_filter': status_filter,
-        'order_statuses': Order._meta.get_field('status').choices,
+        'order_statuses': ORDER_STATUS_CHOICES,
     }
     
     return render(request, 'stores/orders_management.html', context)
@@ -300,25 +378,21 @@ def store_orders(request):
 @store_required
 def order_detail(request, order_id):
     """View order details - Only accessible by store owners and staff"""
-    try:
-        if request.user.user_type == 'store_owner':
-            store = Store.objects.get(owner=request.user)
-        elif request.user.user_type == 'store_staff':
-            store = Store.objects.get(storestaff__user=request.user)
-        else:
-            return render(request, 'stores/access_denied.html')
-        
-        order = get_object_or_404(Order, id=order_id, store=store)
-    except Store.DoesNotExist:
+    store = request.store
+    if store is None:
         return render(request, 'stores/access_denied.html')
     
-    # Get staff assignment if exists
-    from .models import StaffOrderAssignment
-    try:
-        staff_assignment = StaffOrderAssignment.objects.get(order=order)
-        order.staff_assignment = staff_assignment
-    except StaffOrderAssignment.DoesNotExist:
-        order.staff_assignment = None
+    # Everything the detail page renders, including the staff assignment (None-safe in
+    # the template), comes from one joined query plus one prefetch for the items
+    order = get_object_or_404(
+        Order.objects.select_related(
+            'user', 'delivery_address', 'delivery_slot', 'staff_assignment__staff__user'
+        ).prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('store_product__product__category'))
+        ),
+        id=order_id,
+        store=store
+    )
     
     # Get available staff for assignment
     available_staff = StoreStaff.objects.filter(
@@ -336,14 +410,13 @@ def order_detail(request, order_id):
 
 
 @store_required
+@condition(etag_func=_inventory_etag)
+@cache_control(private=True, no_cache=True)
+@vary_on_cookie
 def store_inventory(request):
     """View and manage store inventory - Only accessible by store owners and staff"""
-    try:
-        if request.user.user_type == 'store_owner':
-            store = Store.objects.get(owner=request.user)
-        else:
-            store = Store.objects.get(storestaff__user=request.user)
-    except Store.DoesNotExist:
+    store = request.store
+    if store is None:
         return redirect('core:home')
     
     # Handle POST request for adding new products
@@ -358,7 +431,7 @@ def store_inventory(request):
             
             # Get the category object
             try:
-                category = Category.objects.get(id=category_id, is_active=True)
+                category = Category.objects.only('id').get(id=category_id, is_active=True)
             except Category.DoesNotExist:
                 messages.error(request, 'Please select a valid category.')
                 return redirect('stores:inventory_management')
@@ -373,70 +446,68 @@ def store_inventory(request):
                 messages.error(request, 'You can upload maximum 5 images.')
                 return redirect('stores:inventory_management')
             
-            # Create the product with the first image as main image
-            product, created = Product.objects.get_or_create(
-                name=product_name,
-                category=category,
-                defaults={
-                    'description': description,
-                    'brand': store.name,
-                    'slug': product_name.lower().replace(' ', '-').replace('/', '-'),
-                    'weight_per_unit': float(request.POST.get('weight_per_unit', 1000)),
-                    'unit_type': request.POST.get('unit_type', 'grams'),
-                    'nutritional_info': {},
-                    'image': images[0],  # First image as main image
-                }
-            )
-            
-            # If product already exists, update the main image
-            if not created:
-                product.image = images[0]
-                product.description = description
-                product.save()
-            
-            # Add additional images (if any)
-            if len(images) > 1:
-                # Clear existing additional images for this product
-                ProductImage.objects.filter(product=product).delete()
+            # Product, images and store product are written in one transaction
+            with transaction.atomic():
+                # Create the product with the first image as main image
+                product, created = Product.objects.get_or_create(
+                    name=product_name,
+                    category=category,
+                    defaults={
+                        'description': description,
+                        'brand': store.name,
+                        'slug': product_name.lower().replace(' ', '-').replace('/', '-'),
+                        'weight_per_unit': float(request.POST.get('weight_per_unit', 1000)),
+                        'unit_type': request.POST.get('unit_type', 'grams'),
+                        'nutritional_info': {},
+                        'image': images[0],  # First image as main image
+                    }
+                )
+                
+                # If product already exists, update the main image
+                if not created:
+                    product.image = images[0]
+                    product.description = description
+                    product.save(update_fields=['image', 'description', 'updated_at'])
                 
-                for i, image in enumerate(images[1:], 1):  # Skip first image
-                    ProductImage.objects.create(
+                # Add additional images (if any)
+                if len(images) > 1:
+                    # Clear existing additional images for this product
+                    ProductImage.objects.filter(product=product).delete()
+                    
+                    # One INSERT for the extra images (each file is still written to storage)
+                    ProductImage.objects.bulk_create([
+                        ProductImage(product=product, image=image, sort_order=i, is_active=True)
+                        for i, image in enumerate(images[1:], 1)  # Skip first image
+                    ], batch_size=10)
+                
+                # Create or update store product in a single upsert
+                StoreProduct.objects.bulk_create([
+                    StoreProduct(
+                        store=store,
                         product=product,
-                        image=image,
-                        sort_order=i,
-                        is_active=True
+                        price=float(request.POST.get('price', 0)),
+                        stock_quantity=int(request.POST.get('stock_quantity', 0)),
+                        is_available=request.POST.get('is_available') == 'on',
                     )
+                ], update_conflicts=True, unique_fields=['store', 'product'],
+                   update_fields=['price', 'stock_quantity', 'is_available', 'updated_at'])
             
-            # Create or update store product
-            store_product, created = StoreProduct.objects.get_or_create(
-                store=store,
-                product=product,
-                defaults={
-                    'price': float(request.POST.get('price', 0)),
-                    'stock_quantity': int(request.POST.get('stock_quantity', 0)),
-                    'is_available': request.POST.get('is_available') == 'on',
-                }
-            )
-            
-            if not created:
-                # Update existing product
-                store_product.price = float(request.POST.get('price', 0))
-                store_product.stock_quantity = int(request.POST.get('stock_quantity', 0))
-                store_product.is_available = request.POST.get('is_available') == 'on'
-                store_product.save()
+            # bulk_create skips StoreProduct.save, so drop the cached counts here
+            StoreProduct.clear_store_caches(store.id)
             
             messages.success(request, f'Product "{product_name}" added successfully!')
             return redirect('stores:inventory_management')
             
-        except Exception as e:
-            print(f"Product addition error: {e}")  # For debugging
-            import traceback
-            traceback.print_exc()
+        except (ValueError, OSError, DatabaseError):
+            # Bad numeric input, a failed image write or a clashing product slug
+            logger.exception(f"Product addition failed for store {store.id}")
             messages.error(request, 'Failed to add product. Please try again.')
             return redirect('stores:inventory_management')
     
-    # Get products for this store
-    products = StoreProduct.objects.filter(store=store).select_related('product')
+    # Get products for this store (only the columns the inventory cards render)
+    products = StoreProduct.objects.filter(store=store).select_related(
+        'product__category'
+    ).only(*INVENTORY_LIST_FIELDS)
     
     # Filter by stock level
     stock_filter = request.GET.get('stock', '')
@@ -445,13 +516,19 @@ def store_inventory(request):
     elif stock_filter == 'out':
         products = products.filter(stock_quantity=0)
     
+    # Paginate; the unfiltered total is the per-store count StoreProduct writes keep fresh
+    count_cache_key = None if stock_filter else STORE_PRODUCT_COUNT_CACHE_KEY.format(store_id=store.id)
+    paginator = CachedCountPaginator(products, INVENTORY_PAGE_SIZE, count_cache_key=count_cache_key)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
     # Get categories for the form
     from catalog.models import Category
     categories = Category.objects.filter(is_active=True).order_by('sort_order', 'name')
     
     context = {
         'store': store,
-        'products': products,
+        'products': page_obj,
+        'page_obj': page_obj,
         'stock_filter': stock_filter,
         'categories': categories,
     }
@@ -462,12 +539,8 @@ def store_inventory(request):
 @store_required
 def edit_store_product(request, product_id):
     """Edit a store product"""
-    try:
-        if request.user.user_type == 'store_owner':
-            store = Store.objects.get(owner=request.user)
-        else:
-            store = Store.objects.get(storestaff__user=request.user)
-    except Store.DoesNotExist:
+    store = request.store
+    if store is None:
         return redirect('core:home')
     
     # Get the store product
@@ -480,17 +553,16 @@ def edit_store_product(request, product_id):
             store_product.stock_quantity = int(request.POST.get('stock_quantity', store_product.stock_quantity))
             store_product.is_available = request.POST.get('is_available') == 'on'
             store_product.is_featured = request.POST.get('is_featured') == 'on'
-            store_product.discount_percentage = int(request.POST.get('discount_percentage', 0)) if request.POST.get('discount_percentage') else None
             
             # Update base product details if provided
             if request.POST.get('description'):
                 store_product.product.description = request.POST.get('description')
-                store_product.product.save()
+                store_product.product.save(update_fields=['description', 'updated_at'])
             
-            store_product.save()
+            store_product.save(update_fields=['price', 'stock_quantity', 'is_available', 'is_featured', 'updated_at'])
             messages.success(request, f'Product "{store_product.product.name}" updated successfully!')
             
-        except Exception as e:
+        except (ValueError, DatabaseError) as e:
             messages.error(request, f'Error updating product: {str(e)}')
             
         return redirect('stores:inventory_management')
@@ -509,12 +581,8 @@ def edit_store_product(request, product_id):
 @store_required
 def delete_store_product(request, product_id):
     """Delete a store product"""
-    try:
-        if request.user.user_type == 'store_owner':
-            store = Store.objects.get(owner=request.user)
-        else:
-            store = Store.objects.get(storestaff__user=request.user)
-    except Store.DoesNotExist:
+    store = request.store
+    if store is None:
         return redirect('core:home')
     
     # Get the store product
@@ -534,40 +602,34 @@ def delete_store_product(request, product_id):
 
 
 @store_required
+@condition(etag_func=_delivery_agents_etag)
+@cache_control(max_age=30, private=True)
+@vary_on_cookie
 def delivery_agents(request):
     """View delivery agents - Only accessible by store owners and staff"""
-    try:
-        if request.user.user_type == 'store_owner':
-            store = Store.objects.get(owner=request.user)
-        else:
-            store = Store.objects.get(storestaff__user=request.user)
-    except Store.DoesNotExist:
+    store = request.store
+    if store is None:
         return redirect('core:home')
     
     # Get delivery agents in the store's coverage area
     from locations.models import ZipArea
-    from stores.models import StoreZipCoverage
     
     # Get ZIP areas served by this store
-    served_zip_areas = ZipArea.objects.filter(
+    served_zip_areas = list(ZipArea.objects.filter(
         store_coverages__store=store,
         store_coverages__is_active=True,
         is_active=True
-    ).distinct()
+    ).distinct())
     
-    # Get delivery agents that serve any of the ZIP areas this store serves
-    from delivery.models import DeliveryAgent, DeliveryAgentZipCoverage
-    
-    # Combine both conditions into a single QuerySet using Q to avoid union issues
-    from django.db.models import Q
-
+    # Get delivery agents that are assigned to the store or serve any of its ZIP areas
     agents = DeliveryAgent.objects.filter(
-        Q(zip_coverages__zip_area__in=served_zip_areas, zip_coverages__is_active=True) | Q(store=store)
-    ).select_related('user').distinct().order_by('-is_available', 'user__first_name')
+        _store_agents_q(store, [zip_area.id for zip_area in served_zip_areas])
+    ).select_related('user').order_by('-is_available', 'user__first_name')
     
-    # Separate available and unavailable agents
-    available_agents = agents.filter(is_available=True)
-    unavailable_agents = agents.filter(is_available=False)
+    # Load the agents once and separate available and unavailable ones in Python
+    agents = list(agents)
+    available_agents = [agent for agent in agents if agent.is_available]
+    unavailable_agents = [agent for agent in agents if not agent.is_available]
     
     context = {
         'store': store,
@@ -580,153 +642,137 @@ def delivery_agents(request):
     return render(request, 'stores/delivery_agents.html', context)
 
 
-@store_required
+def _new_order_counts(store):
+    """Pending and last-five-minute order counts in one query, cached briefly since the dashboard polls them"""
+    def load_counts():
+        return Order.objects.filter(store=store, status__in=PENDING_ORDER_STATUSES).aggregate(
+            pending_orders=Count('id'),
+            new_orders=Count('id', filter=Q(
+                status='placed', created_at__gte=timezone.now() - timezone.timedelta(minutes=5)
+            ))
+        )
+    return cache.get_or_set(STORE_NEW_ORDERS_CACHE_KEY.format(store_id=store.id), load_counts, timeout=15)
+
+def _new_orders_etag(request):
+    """ETag built from the cached counts, so an unchanged poll is answered with a 304"""
+    if request.store is None:
+        return None
+    counts = _new_order_counts(request.store)
+    return f"{counts['pending_orders']}-{counts['new_orders']}"
+
+
+@require_GET
+@store_required(fields=['id'])
+@condition(etag_func=_new_orders_etag)
+@cache_control(max_age=15, private=True)
+@vary_on_cookie
 def new_orders_count(request):
     """AJAX endpoint to get new orders count - Only accessible by store owners and staff"""
-    try:
-        if request.user.user_type == 'store_owner':
-            store = Store.objects.get(owner=request.user)
-        else:
-            store = Store.objects.get(storestaff__user=request.user)
-        
-        pending_orders = Order.objects.filter(
-            store=store,
-            status='pending'
-        ).count()
-        
-        new_orders = Order.objects.filter(
-            store=store,
-            status='pending',
-            created_at__gte=timezone.now() - timezone.timedelta(minutes=5)
-        ).count()
-        
-        return JsonResponse({
-            'success': True,
-            'pending_orders': pending_orders,
-            'new_orders': new_orders,
-        })
-        
-    except Store.DoesNotExist:
+    store = request.store
+    if store is None:
         return JsonResponse({
             'success': False,
             'message': 'Store not found'
         })
+    
+    counts = _new_order_counts(store)
+    
+    return JsonResponse({
+        'success': True,
+        'pending_orders': counts['pending_orders'],
+        'new_orders': counts['new_orders'],
+    })
 
 
+@require_POST
 @store_required
 def update_order_status(request):
     """AJAX endpoint to update order status - Only accessible by store owners and staff"""
-    if request.method == 'POST':
-        try:
-            # Lightweight debug trace to confirm request arrives in server logs
-            try:
-                print('UPDATE_ORDER_STATUS_HIT', 'user=', getattr(request.user, 'username', None), 'COOKIES=', list(getattr(request, 'COOKIES', {}).keys()), 'POST_keys=', list(request.POST.keys()))
-            except Exception:
-                pass
-            if request.user.user_type == 'store_owner':
-                store = Store.objects.get(owner=request.user)
-            else:
-                store = Store.objects.get(storestaff__user=request.user)
-            
-            order_id = request.POST.get('order_id')
-            status = request.POST.get('status')
+    try:
+        logger.debug('order_status_update hit user=%s post_keys=%s', request.user.username, list(request.POST.keys()))
+        store = request.store
+        if store is None:
+            return JsonResponse({'success': False, 'message': 'Store not found', 'posted_order_id': request.POST.get('order_id'), 'posted_status': request.POST.get('status')})
+        
+        order_id = request.POST.get('order_id')
+        status = request.POST.get('status')
 
-            # Echo posted values for diagnostics
-            if not order_id:
-                return JsonResponse({'success': False, 'message': 'order_id not provided', 'posted_status': status})
+        # Echo posted values for diagnostics
+        if not order_id:
+            return JsonResponse({'success': False, 'message': 'order_id not provided', 'posted_status': status})
 
-            order = get_object_or_404(Order, id=order_id, store=store)
-
-            # Validate status choice
-            valid_statuses = [c[0] for c in Order._meta.get_field('status').choices]
-            if status not in valid_statuses:
-                return JsonResponse({'success': False, 'message': 'invalid status', 'posted_status': status, 'valid_statuses': valid_statuses})
+        # Validate status choice
+        if status not in VALID_ORDER_STATUSES:
+            return JsonResponse({'success': False, 'message': 'invalid status', 'posted_status': status, 'valid_statuses': VALID_ORDER_STATUSES})
 
+        # A single-column UPDATE unless save() has work to do for the new status
+        if status in ORDER_SAVE_HOOK_STATUSES:
+            order = get_object_or_404(Order, id=order_id, store=store)
             old_status = order.status
             order.status = status
-            order.save()
+            order.save(update_fields=ORDER_STATUS_UPDATE_FIELDS)
+        else:
+            order = get_object_or_404(Order.objects.only('id', 'status'), id=order_id, store=store)
+            old_status = order.status
+            Order.objects.filter(pk=order.pk).update(status=status, updated_at=timezone.now())
+            order.status = status
+            # update() bypasses Order.save(), so clear the store's cached figures here
+            clear_store_order_caches(store.id)
 
-            # Success trace
-            try:
-                print('UPDATE_ORDER_STATUS_SUCCESS', f'order={order.id}', f'from={old_status}', f'to={order.status}', 'by=', getattr(request.user, 'username', None))
-            except Exception:
-                pass
+        logger.debug('order_status_update user=%s order=%s from=%s to=%s', request.user.username, order.id, old_status, order.status)
 
-            return JsonResponse({
-                'success': True,
-                'message': f'Order status updated to {status}',
-                'order_id': order.id,
-                'old_status': old_status,
-                'new_status': order.status,
-            })
-            
-        except Store.DoesNotExist:
-            return JsonResponse({'success': False, 'message': 'Store not found', 'posted_order_id': request.POST.get('order_id'), 'posted_status': request.POST.get('status')})
-        except Exception as e:
-            # Include posted values for easier debugging
-            return JsonResponse({'success': False, 'message': str(e), 'posted_order_id': request.POST.get('order_id'), 'posted_status': request.POST.get('status')})
-    
-    return JsonResponse({
-        'success': False,
-        'message': 'Invalid request method'
-    })
+        return JsonResponse({
+            'success': True,
+            'message': f'Order status updated to {status}',
+            'order_id': order.id,
+            'old_status': old_status,
+            'new_status': order.status,
+        })
+        
+    except (Http404, ValueError, DatabaseError) as e:
+        # Include posted values for easier debugging
+        return JsonResponse({'success': False, 'message': str(e), 'posted_order_id': request.POST.get('order_id'), 'posted_status': request.POST.get('status')})
 
 
-@store_required
+@require_POST
+@store_required(fields=['id'])
 def toggle_store_status(request):
     """AJAX endpoint to toggle store open/closed status"""
-    if request.method == 'POST':
-        try:
-            if request.user.user_type == 'store_owner':
-                store = Store.objects.get(owner=request.user)
-            else:
-                store = Store.objects.get(storestaff__user=request.user)
-            
-            # Toggle store status
-            if store.status == 'open':
-                store.status = 'closed'
-            else:
-                store.status = 'open'
-            
-            store.save()
-            
-            return JsonResponse({
-                'success': True,
-                'status': store.status,
-                'message': f'Store is now {store.status}'
-            })
-            
-        except Store.DoesNotExist:
+    try:
+        store = request.store
+        if store is None:
             return JsonResponse({
                 'success': False,
                 'message': 'Store not found'
             })
-        except Exception as e:
-            return JsonResponse({
-                'success': False,
-                'message': str(e)
-            })
-    
-    return JsonResponse({
-        'success': False,
-        'message': 'Invalid request method'
-    })
-
-
-class UpdateInventoryView(TemplateView):
-    def post(self, request, *args, **kwargs):
-        return JsonResponse({'success': True})
+        
+        # Flip the status inside the UPDATE itself so two concurrent toggles cannot
+        # both write the same value; the row lock holds until the read-back below
+        with transaction.atomic():
+            Store.objects.filter(pk=store.pk).update(
+                status=Case(When(status='open', then=Value('closed')), default=Value('open')),
+                updated_at=timezone.now()
+            )
+            store.status = Store.objects.filter(pk=store.pk).values_list('status', flat=True).get()
+        
+        return JsonResponse({
+            'success': True,
+            'status': store.status,
+            'message': f'Store is now {store.status}'
+        })
+        
+    except DatabaseError as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        })
 
 
 @store_required
 def manage_zip_coverage(request):
     """View for store managers to select ZIP areas they serve"""
-    try:
-        if request.user.user_type == 'store_owner':
-            store = Store.objects.get(owner=request.user)
-        else:
-            store = Store.objects.get(storestaff__user=request.user)
-    except Store.DoesNotExist:
+    store = request.store
+    if store is None:
         return redirect('core:home')
     
     from .forms import StoreZipCoverageForm
@@ -743,7 +789,7 @@ def manage_zip_coverage(request):
     context = {
         'store': store,
         'form': form,
-        'current_coverage': store.zip_coverages.filter(is_active=True).select_related('zip_area'),
+        'current_coverage': StoreZipCoverage.objects.active_for(store),
     }
     
     return render(request, 'stores/manage_zip_coverage.html', context)
@@ -762,11 +808,7 @@ def cancel_order(request, order_id):
     order = get_object_or_404(Order, id=order_id)
     
     # Verify store has permission to cancel this order
-    user_stores = Store.objects.filter(
-        Q(owner=request.user) | Q(staff_members=request.user)
-    ).values_list('id', flat=True)
-    
-    if order.store.id not in user_stores:
+    if request.store is None or order.store_id != request.store.id:
         messages.error(request, 'You do not have permission to cancel this order.')
         return redirect('stores:order_detail', order_number=order.order_number)
     
@@ -795,11 +837,7 @@ def process_refund(request, order_id):
     order = get_object_or_404(Order, id=order_id)
     
     # Verify store has permission to refund this order
-    user_stores = Store.objects.filter(
-        Q(owner=request.user) | Q(staff_members=request.user)
-    ).values_list('id', flat=True)
-    
-    if order.store.id not in user_stores:
+    if request.store is None or order.store_id != request.store.id:
         messages.error(request, 'You do not have permission to process refund for this order.')
         return redirect('stores:order_detail', order_number=order.order_number)
     
@@ -831,11 +869,7 @@ def add_order_note(request, order_id):
     order = get_object_or_404(Order, id=order_id)
     
     # Verify store has permission to add notes to this order
-    user_stores = Store.objects.filter(
-        Q(owner=request.user) | Q(staff_members=request.user)
-    ).values_list('id', flat=True)
-    
-    if order.store.id not in user_stores:
+    if request.store is None or order.store_id != request.store.id:
         messages.error(request, 'You do not have permission to add notes to this order.')
         return redirect('stores:order_detail', order_number=order.order_number)
     
@@ -1,9 +1,11 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from .models import Store, StoreStaff
+from django.db import DatabaseError
+from django.template import TemplateDoesNotExist
+from .models import Store
 from accounts.models import User
-from core.decorators import StoreRequiredMixin
+from core.decorators import StoreRequiredMixin, get_user_store
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 
@@ -11,11 +13,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 def store_profile(request):
     """Store profile management"""
     try:
-        if request.user.user_type == 'store_owner':
-            store = request.user.owned_stores.first()
-        else:
-            store_staff = StoreStaff.objects.filter(user=request.user).first()
-            store = store_staff.store if store_staff else None
+        store = get_user_store(request)
         
         if not store:
             return redirect('core:dashboard_router')
@@ -25,18 +23,14 @@ def store_profile(request):
             'title': 'Store Profile'
         }
         return render(request, 'stores/store_profile.html', context)
-    except Exception as e:
+    except TemplateDoesNotExist:
         return redirect('core:dashboard_router')
 
 @login_required  
 def business_hours(request):
     """Manage store business hours"""
     try:
-        if request.user.user_type == 'store_owner':
-            store = request.user.owned_stores.first()
-        else:
-            store_staff = StoreStaff.objects.filter(user=request.user).first()
-            store = store_staff.store if store_staff else None
+        store = get_user_store(request)
             
         if not store:
             return redirect('core:dashboard_router')
@@ -58,7 +52,7 @@ def business_hours(request):
                 }
             
             store.business_hours = business_hours
-            store.save()
+            store.save(update_fields=['business_hours', 'updated_at'])
             return redirect('stores:business_hours')
             
         context = {
@@ -66,18 +60,14 @@ def business_hours(request):
             'title': 'Business Hours'
         }
         return render(request, 'stores/business_hours.html', context)
-    except Exception as e:
+    except (TemplateDoesNotExist, DatabaseError):
         return redirect('core:dashboard_router')
 
 @login_required
 def store_analytics(request):
     """Store analytics and reports"""
     try:
-        if request.user.user_type == 'store_owner':
-            store = request.user.owned_stores.first()
-        else:
-            store_staff = StoreStaff.objects.filter(user=request.user).first()
-            store = store_staff.store if store_staff else None
+        store = get_user_store(request)
             
         if not store:
             return redirect('core:dashboard_router')
@@ -87,7 +77,7 @@ def store_analytics(request):
             'title': 'Store Analytics'
         }
         return render(request, 'stores/analytics.html', context)
-    except Exception as e:
+    except TemplateDoesNotExist:
         return redirect('core:dashboard_router')
 
 @login_required
@@ -114,13 +104,15 @@ def create_store(request):
                 'state': request.POST.get('state'),
                 'zip_code': request.POST.get('zip_code'),
                 'owner': request.user,
-                'store_code': f'ST{Store.objects.count() + 1:04d}',
+                # Same owner-derived code as store registration: no table COUNT, and no
+                # race between owners since each owner creates at most one store here
+                'store_code': f'ST{request.user.id:04d}',
             }
             
             store = Store.objects.create(**store_data)
             return redirect('stores:dashboard')
             
-        except Exception as e:
+        except DatabaseError:
             pass  # Handle errors silently
     
     context = {
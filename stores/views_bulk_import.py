@@ -3,21 +3,48 @@ CSV Bulk Import System for Products
 """
 import csv
 import io
+import uuid
+from collections import Counter
+from itertools import islice
 from decimal import Decimal, InvalidOperation
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
-from django.db import transaction
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.utils.text import slugify
 from catalog.models import Product, StoreProduct, Category
-from stores.models import Store
+from core.decorators import get_owned_store, get_user_store
+from stores.tasks import import_products_csv
+
+# Largest CSV accepted for validation or import
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+# Columns every import CSV must have
+REQUIRED_HEADERS = frozenset({'name', 'category', 'price', 'weight', 'unit_type'})
+
+# Accepted spellings of a true is_featured cell
+TRUTHY_VALUES = frozenset({'true', 'yes', '1'})
+
+# Progress of a background CSV import, written by the task and polled by the page
+BULK_IMPORT_JOB_CACHE_KEY = 'bulk_import:{job_id}'
+BULK_IMPORT_JOB_TIMEOUT = 60 * 60
+BULK_IMPORT_UPLOAD_DIR = 'bulk_imports'
+
+# Base slugs per startswith query when reserving product slugs
+SLUG_LOOKUP_CHUNK = 200
+
+# Rows written per transaction, so a large file never holds one long-running transaction
+IMPORT_BATCH_SIZE = 1000
 
 @login_required
 def bulk_import_products(request):
     """Bulk import products via CSV"""
     # Check if user owns a store
-    user_store = Store.objects.filter(owner=request.user).first()
+    user_store = get_owned_store(request)
     if not user_store:
         return redirect('stores:dashboard')
     
@@ -34,6 +61,25 @@ def bulk_import_products(request):
     
     return render(request, 'stores/bulk_import.html', context)
 
+def open_csv_reader(csv_file):
+    """
+    DictReader decoding the upload as it is read, instead of holding the raw
+    bytes and a decoded copy of the whole file in memory
+    """
+    csv_file.seek(0)
+    return csv.DictReader(io.TextIOWrapper(csv_file.file, encoding='utf-8', newline=''))
+
+def upload_too_large():
+    """Rejection for a CSV over MAX_UPLOAD_BYTES, sent before any of it is decoded"""
+    return JsonResponse({
+        'success': False,
+        'message': f'CSV exceeds {MAX_UPLOAD_BYTES // 1024 // 1024} MB limit'
+    })
+
+def missing_headers(csv_reader):
+    """Sorted required headers absent from the CSV's header row"""
+    return sorted(REQUIRED_HEADERS - set(csv_reader.fieldnames or ()))
+
 @require_POST
 def handle_csv_upload(request, store):
     """Handle CSV file upload and processing"""
@@ -44,6 +90,8 @@ def handle_csv_upload(request, store):
         })
     
     csv_file = request.FILES['csv_file']
+    if csv_file.size and csv_file.size > MAX_UPLOAD_BYTES:
+        return upload_too_large()
     
     # Validate file type
     if not csv_file.name.endswith('.csv'):
@@ -54,24 +102,26 @@ def handle_csv_upload(request, store):
     
     try:
         # Read and process CSV
-        csv_data = csv_file.read().decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(csv_data))
+        csv_reader = open_csv_reader(csv_file)
         
         # Validate headers
-        required_headers = ['name', 'category', 'price', 'weight', 'unit_type']
-        if not all(header in csv_reader.fieldnames for header in required_headers):
+        missing = missing_headers(csv_reader)
+        if missing:
             return JsonResponse({
                 'success': False,
-                'message': f'CSV must contain these headers: {", ".join(required_headers)}'
+                'message': f'Missing required headers: {missing}'
             })
         
-        # Process rows
-        results = process_csv_rows(csv_reader, store)
+        # Hand the rows to a background task; the page polls import_status for progress
+        job_id = uuid.uuid4().hex
+        file_path = default_storage.save(f'{BULK_IMPORT_UPLOAD_DIR}/{job_id}.csv', csv_file)
+        set_import_job(job_id, store.id, state='queued')
+        transaction.on_commit(lambda: import_products_csv.delay(job_id, store.id, file_path))
         
         return JsonResponse({
             'success': True,
-            'message': f'Import completed: {results["created"]} created, {results["updated"]} updated, {results["errors"]} errors',
-            'details': results
+            'message': 'Import started',
+            'job_id': job_id
         })
         
     except Exception as e:
@@ -80,32 +130,89 @@ def handle_csv_upload(request, store):
             'message': f'Error processing CSV: {str(e)}'
         })
 
-def process_csv_rows(csv_reader, store):
-    """Process each row in the CSV"""
+def set_import_job(job_id, store_id, **state):
+    """Record the state and counters of a background CSV import"""
+    cache.set(
+        BULK_IMPORT_JOB_CACHE_KEY.format(job_id=job_id),
+        {'store_id': store_id, **state},
+        BULK_IMPORT_JOB_TIMEOUT
+    )
+
+@login_required
+def import_status(request, job_id):
+    """Progress of a background CSV import started by this store"""
+    # Polled every second while an import runs: the id-only lookup is cached per user
+    user_store = get_user_store(request, fields=['id'])
+    job = cache.get(BULK_IMPORT_JOB_CACHE_KEY.format(job_id=job_id))
+    if not user_store or not job or job.pop('store_id') != user_store.id:
+        return JsonResponse({
+            'success': False,
+            'message': 'Import job not found'
+        }, status=404)
+    
+    return JsonResponse({'success': True, **job})
+
+def chunks(iterable, size):
+    """Yield successive lists of up to size items from iterable"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+def process_csv_rows(csv_reader, store, progress=None):
+    """
+    Validate the CSV rows and write the valid ones, committing each batch of
+    IMPORT_BATCH_SIZE rows in its own transaction. A batch the database rejects is
+    rolled back and its rows reported as errors; the later batches still run.
+    progress, if given, is called with the running results after every batch
+    """
     results = {
+        'processed': 0,
         'created': 0,
         'updated': 0,
         'errors': 0,
         'error_details': []
     }
     
-    with transaction.atomic():
-        for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 because row 1 is headers
+    rows = enumerate(csv_reader, start=2)  # Start at 2 because row 1 is headers
+    for batch in chunks(rows, IMPORT_BATCH_SIZE):
+        parsed_rows = []
+        for row_num, row in batch:
             try:
-                process_single_row(row, store, results)
+                data = parse_single_row(row)
             except Exception as e:
-                results['errors'] += 1
-                results['error_details'].append({
-                    'row': row_num,
-                    'error': str(e),
-                    'data': row
-                })
+                add_row_error(results, row_num, row, e)
+            else:
+                data['row_num'], data['row'] = row_num, row
+                parsed_rows.append(data)
+        
+        if parsed_rows:
+            checkpoint = (results['created'], results['updated'], results['errors'], len(results['error_details']))
+            try:
+                with transaction.atomic():
+                    write_parsed_rows(parsed_rows, store, results)
+            except DatabaseError as e:
+                # Nothing from this batch was saved: drop its counts, report its rows
+                results['created'], results['updated'], results['errors'], detail_count = checkpoint
+                del results['error_details'][detail_count:]
+                for data in parsed_rows:
+                    add_row_error(results, data['row_num'], data['row'], f"Batch not saved: {e}")
+        results['processed'] += len(batch)
+        if progress:
+            progress(results)
     
     return results
 
-def process_single_row(row, store, results):
-    """Process a single CSV row"""
-    # Extract and validate data
+def add_row_error(results, row_num, row, error):
+    """Record a rejected CSV row"""
+    results['errors'] += 1
+    results['error_details'].append({
+        'row': row_num,
+        'error': str(error),
+        'data': row
+    })
+
+def parse_single_row(row):
+    """Extract and validate a single CSV row"""
     name = row['name'].strip()
     category_name = row['category'].strip()
     price_str = row['price'].strip()
@@ -115,7 +222,7 @@ def process_single_row(row, store, results):
     sku = row.get('sku', '').strip()
     brand = row.get('brand', '').strip()
     stock_quantity_str = row.get('stock_quantity', '0').strip()
-    is_featured = row.get('is_featured', '').lower() in ['true', 'yes', '1']
+    is_featured = row.get('is_featured', '').strip().lower() in TRUTHY_VALUES
     
     if not all([name, category_name, price_str, weight_str]):
         raise ValueError("Missing required fields: name, category, price, or weight")
@@ -128,106 +235,141 @@ def process_single_row(row, store, results):
     except (InvalidOperation, ValueError) as e:
         raise ValueError(f"Invalid numeric value: {e}")
     
-    # Get or create category
-    category, created = Category.objects.get_or_create(
-        name=category_name,
-        defaults={
-            'slug': slugify(category_name),
-            'is_active': True
-        }
-    )
-    
-    # Generate slug for product
-    slug = slugify(name)
-    
-    # Make slug unique if needed
-    base_slug = slug
-    counter = 1
-    while Product.objects.filter(slug=slug).exists():
-        slug = f"{base_slug}-{counter}"
-        counter += 1
-    
-    # Get or create product
-    product, product_created = Product.objects.get_or_create(
-        name=name,
-        defaults={
-            'slug': slug,
-            'description': description or f"Fresh {name.lower()} delivered to your doorstep",
-            'category': category,
-            'sku': sku,
-            'brand': brand,
-            'weight_per_unit': weight,
-            'unit_type': unit_type,
-            'is_active': True
-        }
-    )
-    
-    # Create or update store product
-    store_product, sp_created = StoreProduct.objects.update_or_create(
-        store=store,
-        product=product,
-        defaults={
-            'price': price,
-            'stock_quantity': stock_quantity,
-            'is_available': True,
-            'availability_status': 'in_stock' if stock_quantity > 0 else 'out_of_stock',
-            'is_featured': is_featured
-        }
-    )
-    
-    if sp_created or product_created:
-        results['created'] += 1
-    else:
-        results['updated'] += 1
+    return {
+        'name': name,
+        'category_name': category_name,
+        'price': price,
+        'weight': weight,
+        'unit_type': unit_type,
+        'description': description,
+        'sku': sku,
+        'brand': brand,
+        'stock_quantity': stock_quantity,
+        'is_featured': is_featured,
+    }
 
-def download_sample_csv(request):
-    """Download a sample CSV file for bulk import"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="sample_products.csv"'
-    
-    writer = csv.writer(response)
-    
-    # Write headers
-    writer.writerow([
-        'name', 'category', 'price', 'weight', 'unit_type', 
-        'description', 'sku', 'brand', 'stock_quantity', 'is_featured'
-    ])
-    
-    # Write sample data
-    sample_data = [
-        ['Chicken Breast Boneless', 'Chicken', '320', '1000', 'grams', 
-         'Fresh boneless chicken breast', 'CHK001', 'Fresh Farm', '50', 'true'],
-        ['Fresh Pomfret', 'Seafood', '450', '1000', 'grams', 
-         'Fresh pomfret fish', 'FISH001', 'Ocean Fresh', '20', 'true'],
-        ['Mutton Curry Cut', 'Mutton', '650', '1000', 'grams', 
-         'Fresh mutton curry cut', 'MUT001', 'Premium Meat', '30', 'false'],
-        ['Tiger Prawns', 'Seafood', '520', '500', 'grams', 
-         'Large tiger prawns', 'PRAWN001', 'Sea Harvest', '25', 'true'],
-    ]
-    
-    for row in sample_data:
-        writer.writerow(row)
+def write_parsed_rows(parsed_rows, store, results):
+    """Upsert categories, products and store products for the parsed rows in bulk"""
+    # Categories: one lookup, one INSERT for the missing names, then one re-read
+    category_names = {data['category_name'] for data in parsed_rows}
+    categories = {c.name: c for c in Category.objects.filter(name__in=category_names)}
+    missing_names = category_names - categories.keys()
+    if missing_names:
+        Category.objects.bulk_create([
+            Category(name=category_name, slug=slugify(category_name), is_active=True)
+            for category_name in missing_names
+        ], ignore_conflicts=True)
+        categories.update((c.name, c) for c in Category.objects.filter(name__in=missing_names))
+    
+    # A new category whose slug clashes with an existing one is skipped by the
+    # INSERT above; its rows are reported instead of failing the whole file
+    unresolved = [data for data in parsed_rows if data['category_name'] not in categories]
+    for data in unresolved:
+        add_row_error(results, data['row_num'], data['row'], f"Could not create category '{data['category_name']}'")
+    if unresolved:
+        parsed_rows = [data for data in parsed_rows if data['category_name'] in categories]
+    
+    # Products: names are not unique, so match existing rows by name in one query
+    names = {data['name'] for data in parsed_rows}
+    products = {}
+    for product in Product.objects.filter(name__in=names).order_by('id'):
+        products.setdefault(product.name, product)
+    existing_product_ids = {product.id for product in products.values()}
+    
+    # The first row of each new name creates its product. A row whose SKU is already
+    # taken, in the table or by an earlier new product, would fail the whole INSERT,
+    # so it is reported instead and a later row of that name may create the product
+    skus = {data['sku'] for data in parsed_rows if data['sku'] and data['name'] not in products}
+    used_skus = set(Product.objects.filter(sku__in=skus).values_list('sku', flat=True)) if skus else set()
+    new_rows = {}
+    accepted_rows = []
+    for data in parsed_rows:
+        name = data['name']
+        if name not in products and name not in new_rows:
+            if data['sku'] in used_skus:
+                add_row_error(results, data['row_num'], data['row'], f"SKU '{data['sku']}' is already in use")
+                continue
+            if data['sku']:
+                used_skus.add(data['sku'])
+            new_rows[name] = data
+        accepted_rows.append(data)
+    parsed_rows = accepted_rows
+    
+    # Reserve unique slugs for the new products: load the taken slugs that could
+    # collide ('<base>' or '<base>-<n>'), the suffixes are picked in Python
+    taken_slugs = taken_product_slugs([slugify(name) for name in new_rows])
+    
+    new_products = []
+    for name, data in new_rows.items():
+        base_slug = slug = slugify(name)
+        counter = 1
+        while slug in taken_slugs:
+            slug = f"{base_slug}-{counter}"
+            counter += 1
+        taken_slugs.add(slug)
+        new_products.append(Product(
+            name=name,
+            slug=slug,
+            description=data['description'] or f"Fresh {name.lower()} delivered to your doorstep",
+            category=categories[data['category_name']],
+            sku=data['sku'] or None,
+            brand=data['brand'],
+            weight_per_unit=data['weight'],
+            unit_type=data['unit_type'],
+            is_active=True
+        ))
+    for product in Product.objects.bulk_create(new_products):
+        products[product.name] = product
+    if any(product.pk is None for product in new_products):
+        # Backends without RETURNING support: reload the primary keys
+        for product in Product.objects.filter(slug__in=[p.slug for p in new_products]):
+            products[product.name] = product
+    
+    # Store products: one INSERT ... ON CONFLICT for the whole file
+    existing_sp_ids = set(StoreProduct.objects.filter(
+        store=store, product_id__in=existing_product_ids
+    ).values_list('product_id', flat=True))
+    store_products = {}
+    for data in parsed_rows:
+        product = products[data['name']]
+        if product.id in store_products or product.id in existing_sp_ids:
+            results['updated'] += 1
+        else:
+            results['created'] += 1
+        store_products[product.id] = StoreProduct(
+            store=store,
+            product=product,
+            price=data['price'],
+            stock_quantity=data['stock_quantity'],
+            is_available=True,
+            availability_status='in_stock' if data['stock_quantity'] > 0 else 'out_of_stock',
+            is_featured=data['is_featured']
+        )
+    StoreProduct.objects.bulk_create(
+        store_products.values(),
+        update_conflicts=True,
+        unique_fields=['store', 'product'],
+        update_fields=['price', 'stock_quantity', 'is_available', 'availability_status', 'is_featured', 'updated_at']
+    )
     
-    return response
+    # bulk_create skips StoreProduct.save, so drop the cached counts here
+    StoreProduct.clear_store_caches(store.id)
 
-@login_required
-def import_history(request):
-    """Show import history for the store"""
-    user_store = Store.objects.filter(owner=request.user).first()
-    if not user_store:
-        return redirect('stores:dashboard')
-    
-    # Get recent products added to this store
-    recent_products = StoreProduct.objects.filter(
-        store=user_store
-    ).select_related('product').order_by('-created_at')[:50]
-    
-    context = {
-        'store': user_store,
-        'recent_products': recent_products
-    }
-    
-    return render(request, 'stores/import_history.html', context)
+def taken_product_slugs(base_slugs):
+    """
+    Existing product slugs equal to one of base_slugs or to '<base>-<n>'. Suffixed
+    slugs are only looked up for bases that are taken or repeated in the batch, with
+    the startswith terms OR-ed in chunks to stay within SQLite's expression depth
+    """
+    taken_slugs = set(Product.objects.filter(slug__in=set(base_slugs)).values_list('slug', flat=True))
+    repeated = {slug for slug, count in Counter(base_slugs).items() if count > 1}
+    colliding = sorted(taken_slugs | repeated)
+    for start in range(0, len(colliding), SLUG_LOOKUP_CHUNK):
+        slug_q = Q()
+        for base_slug in colliding[start:start + SLUG_LOOKUP_CHUNK]:
+            slug_q |= Q(slug__startswith=f'{base_slug}-')
+        taken_slugs.update(Product.objects.filter(slug_q).values_list('slug', flat=True))
+    return taken_slugs
 
 def validate_csv_data(request):
     """Validate CSV data before actual import"""
@@ -238,10 +380,11 @@ def validate_csv_data(request):
         })
     
     csv_file = request.FILES['csv_file']
+    if csv_file.size and csv_file.size > MAX_UPLOAD_BYTES:
+        return upload_too_large()
     
     try:
-        csv_data = csv_file.read().decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(csv_data))
+        csv_reader = open_csv_reader(csv_file)
         
         validation_results = {
             'total_rows': 0,
@@ -250,33 +393,20 @@ def validate_csv_data(request):
             'errors': []
         }
         
-        required_headers = ['name', 'category', 'price', 'weight', 'unit_type']
-        
         # Check headers
-        if not all(header in csv_reader.fieldnames for header in required_headers):
+        missing = missing_headers(csv_reader)
+        if missing:
             return JsonResponse({
                 'success': False,
-                'message': f'Missing required headers: {required_headers}'
+                'message': f'Missing required headers: {missing}'
             })
         
-        # Validate each row
+        # Validate each row with the same parser the import uses
         for row_num, row in enumerate(csv_reader, start=2):
             validation_results['total_rows'] += 1
             
             try:
-                # Basic validation
-                if not row['name'].strip():
-                    raise ValueError("Product name is required")
-                
-                if not row['category'].strip():
-                    raise ValueError("Category is required")
-                
-                # Validate price
-                Decimal(row['price'])
-                
-                # Validate weight
-                Decimal(row['weight'])
-                
+                parse_single_row(row)
                 validation_results['valid_rows'] += 1
                 
             except Exception as e:
@@ -297,55 +427,64 @@ def validate_csv_data(request):
             'message': f'Error validating CSV: {str(e)}'
         })
 
+class Echo:
+    """File-like object whose write() returns the value, so csv.writer yields CSV lines"""
+    def write(self, value):
+        return value
+
+SAMPLE_CSV_HEADER = [
+    'name', 'category', 'price', 'weight', 'unit_type', 'description',
+    'sku', 'brand', 'stock_quantity', 'is_featured'
+]
+
+SAMPLE_CSV_ROWS = [
+    ['Fresh Chicken Breast', 'Chicken', '250', '500', 'grams', 
+     'Premium quality chicken breast, boneless and skinless', 'CB001', 
+     'Fresh Farm', '100', 'true'],
+    ['Atlantic Salmon Fillet', 'Fish', '800', '300', 'grams',
+     'Fresh Atlantic salmon, rich in omega-3', 'SF002',
+     'Ocean Fresh', '50', 'false'],
+    ['Mutton Leg Piece', 'Mutton', '600', '1000', 'grams',
+     'Tender mutton leg pieces, perfect for curry', 'ML003',
+     'Premium Meat', '75', 'true'],
+    ['Large Prawns', 'Seafood', '450', '250', 'grams',
+     'Fresh large prawns, cleaned and deveined', 'PR004',
+     'Sea Harvest', '30', 'false'],
+    ['Chicken Wings', 'Chicken', '180', '500', 'grams',
+     'Fresh chicken wings, great for grilling', 'CW005',
+     'Poultry Plus', '80', 'false']
+]
+
 @login_required
 def download_sample_csv(request):
-    """Download a sample CSV file for bulk import"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="sample_products.csv"'
-    
-    writer = csv.writer(response)
-    
-    # Write header
-    writer.writerow([
-        'name', 'category', 'price', 'weight', 'unit_type', 'description',
-        'sku', 'brand', 'stock_quantity', 'is_featured'
-    ])
-    
-    # Write sample data
-    sample_data = [
-        ['Fresh Chicken Breast', 'Chicken', '250', '500', 'grams', 
-         'Premium quality chicken breast, boneless and skinless', 'CB001', 
-         'Fresh Farm', '100', 'true'],
-        ['Atlantic Salmon Fillet', 'Fish', '800', '300', 'grams',
-         'Fresh Atlantic salmon, rich in omega-3', 'SF002',
-         'Ocean Fresh', '50', 'false'],
-        ['Mutton Leg Piece', 'Mutton', '600', '1000', 'grams',
-         'Tender mutton leg pieces, perfect for curry', 'ML003',
-         'Premium Meat', '75', 'true'],
-        ['Large Prawns', 'Seafood', '450', '250', 'grams',
-         'Fresh large prawns, cleaned and deveined', 'PR004',
-         'Sea Harvest', '30', 'false'],
-        ['Chicken Wings', 'Chicken', '180', '500', 'grams',
-         'Fresh chicken wings, great for grilling', 'CW005',
-         'Poultry Plus', '80', 'false']
-    ]
-    
-    for row in sample_data:
-        writer.writerow(row)
-    
-    return response
+    """Download a sample CSV file for bulk import, streamed row by row"""
+    writer = csv.writer(Echo())
+    
+    def rows():
+        yield writer.writerow(SAMPLE_CSV_HEADER)
+        for row in SAMPLE_CSV_ROWS:
+            yield writer.writerow(row)
+    
+    return StreamingHttpResponse(
+        rows(),
+        content_type='text/csv',
+        headers={'Content-Disposition': 'attachment; filename="sample_products.csv"'}
+    )
 
 @login_required 
 def import_history(request):
     """View import history for the store owner"""
-    user_store = Store.objects.filter(owner=request.user).first()
+    user_store = get_owned_store(request)
     if not user_store:
         return redirect('stores:dashboard')
     
     # For now, show recent products added by this store
     recent_imports = StoreProduct.objects.filter(
         store=user_store
-    ).select_related('product', 'product__category').order_by('-created_at')[:50]
+    ).select_related('product', 'product__category').only(
+        'id', 'store_id', 'product_id', 'stock_quantity', 'is_available', 'created_at',
+        'product__name', 'product__image', 'product__category__name'
+    ).order_by('-created_at')[:50]
     
     context = {
         'store': user_store,
@@ -3,38 +3,37 @@ Store Owner Dashboard Views
 Complete store management system with order notifications and delivery assignment
 """
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count
+from django.db.models import Case, Count, F, Prefetch, Q, Sum, Value, When
 from datetime import datetime, timedelta
 import json
 
-from .models import Store, StoreProduct
-from orders.models import Order, OrderItem, Cart
+from .models import StoreProduct
+from orders.models import Order, OrderItem, Cart, ORDER_STATUS_UPDATE_FIELDS
 from delivery.models import DeliveryAgent, DeliveryAssignment
 from catalog.models import Product, Category
 from accounts.models import User
+from core.date_utils import day_bounds
+from core.decorators import store_owner_required
+from .views import INVENTORY_LIST_FIELDS, ORDER_LIST_FIELDS
 
 
-@login_required
-def store_dashboard(request):
+@store_owner_required
+def store_dashboard(request, store):
     """Main store dashboard with real-time order notifications"""
-    try:
-        store = Store.objects.get(owner=request.user, is_active=True)
-    except Store.DoesNotExist:
-        return redirect('core:home')
-    
     # Get dashboard statistics
     today = timezone.now().date()
+    today_start, today_end = day_bounds(today)
     
     # Today's orders
     todays_orders = Order.objects.filter(
         store=store,
-        created_at__date=today
+        created_at__gte=today_start,
+        created_at__lt=today_end
     ).exclude(status='cancelled')
     
     # Pending orders (needs immediate attention)
@@ -44,10 +43,10 @@ def store_dashboard(request):
     ).order_by('-created_at')
     
     # Recent orders (last 7 days)
-    week_ago = today - timedelta(days=7)
+    week_ago_start, _ = day_bounds(today - timedelta(days=7))
     recent_orders = Order.objects.filter(
         store=store,
-        created_at__date__gte=week_ago
+        created_at__gte=week_ago_start
     ).order_by('-created_at')[:10]
     
     # Low stock products
@@ -64,51 +63,58 @@ def store_dashboard(request):
         user__is_active=True
     )
     
-    # Dashboard stats
+    # Dashboard stats: one conditional aggregate per table instead of a query per figure
+    todays_q = Q(created_at__gte=today_start, created_at__lt=today_end) & ~Q(status='cancelled')
+    order_stats = Order.objects.filter(store=store).aggregate(
+        todays_orders=Count('id', filter=todays_q),
+        pending_orders=Count('id', filter=Q(status__in=['pending', 'confirmed'])),
+        todays_revenue=Sum('total_amount', filter=todays_q),
+    )
+    product_stats = StoreProduct.objects.filter(store=store).aggregate(
+        total_products=Count('id'),
+        active_products=Count('id', filter=Q(is_available=True)),
+        low_stock_count=Count('id', filter=Q(stock_quantity__lte=10, is_available=True)),
+    )
+    available_agents = list(available_agents.select_related('user'))
+    
     stats = {
-        'todays_orders': todays_orders.count(),
-        'pending_orders': pending_orders.count(),
-        'todays_revenue': todays_orders.aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0,
-        'total_products': StoreProduct.objects.filter(store=store).count(),
-        'active_products': StoreProduct.objects.filter(
-            store=store, is_available=True
-        ).count(),
-        'low_stock_count': low_stock_products.count(),
-        'available_agents': available_agents.count(),
+        'todays_orders': order_stats['todays_orders'],
+        'pending_orders': order_stats['pending_orders'],
+        'todays_revenue': order_stats['todays_revenue'] or 0,
+        'total_products': product_stats['total_products'],
+        'active_products': product_stats['active_products'],
+        'low_stock_count': product_stats['low_stock_count'],
+        'available_agents': len(available_agents),
     }
     
+    # Counts come from the aggregates above; only the displayed rows are fetched,
+    # each slice once (a list, so template truth tests do not query again)
     context = {
         'store': store,
         'stats': stats,
-        'pending_orders': pending_orders[:5],  # Show only first 5
-        'recent_orders': recent_orders,
-        'low_stock_products': low_stock_products,
+        'pending_orders': list(pending_orders[:5]),  # Show only first 5
+        'recent_orders': list(recent_orders),
+        'low_stock_products': list(low_stock_products),
         'available_agents': available_agents,
-        'todays_orders': todays_orders[:10],
+        'todays_orders': list(todays_orders.order_by('-created_at')[:10]),
     }
     
     return render(request, 'stores/dashboard_enhanced.html', context)
 
 
-@login_required
-def store_orders(request):
+@store_owner_required
+def store_orders(request, store):
     """Store orders management with filtering and status updates"""
-    try:
-        store = Store.objects.get(owner=request.user, is_active=True)
-    except Store.DoesNotExist:
-        return redirect('core:home')
-    
     # Filter parameters
     status_filter = request.GET.get('status', '')
     date_filter = request.GET.get('date', '')
     search_query = request.GET.get('search', '')
     
-    # Base queryset
-    orders = Order.objects.filter(store=store).select_related(
-        'user', 'delivery_assignment__delivery_agent__user'
-    ).prefetch_related('items__store_product__product')
+    # Base queryset: only the columns the listing renders, with the item count
+    # aggregated rather than every item row prefetched
+    orders = Order.objects.filter(store=store).select_related('user').only(
+        *ORDER_LIST_FIELDS, 'user__email'
+    ).annotate(item_count=Count('items'))
     
     # Apply filters
     if status_filter:
@@ -116,7 +122,8 @@ def store_orders(request):
     
     if date_filter:
         if date_filter == 'today':
-            orders = orders.filter(created_at__date=timezone.now().date())
+            today_start, today_end = day_bounds(timezone.now().date())
+            orders = orders.filter(created_at__gte=today_start, created_at__lt=today_end)
         elif date_filter == 'week':
             week_ago = timezone.now() - timedelta(days=7)
             orders = orders.filter(created_at__gte=week_ago)
@@ -155,15 +162,10 @@ def store_orders(request):
     return render(request, 'stores/orders_management.html', context)
 
 
-@login_required
+@store_owner_required(ajax=True)
 @require_POST
-def update_order_status(request):
+def update_order_status(request, store):
     """Update order status and assign delivery agent"""
-    try:
-        store = Store.objects.get(owner=request.user, is_active=True)
-    except Store.DoesNotExist:
-        return JsonResponse({'success': False, 'message': 'Access denied'})
-    
     order_id = request.POST.get('order_id')
     new_status = request.POST.get('status')
     agent_id = request.POST.get('agent_id')
@@ -194,36 +196,24 @@ def update_order_status(request):
         
         # Update order status
         order.status = new_status
-        order.save()
+        order.save(update_fields=ORDER_STATUS_UPDATE_FIELDS)
         
         # Assign delivery agent if provided and status is ready for pickup
         if agent_id and new_status in ['ready_for_pickup', 'out_for_delivery']:
             try:
                 agent = DeliveryAgent.objects.get(id=agent_id, store=store)
                 
-                # Create or update delivery assignment
-                assignment, created = DeliveryAssignment.objects.get_or_create(
+                # Create or reassign the delivery assignment; the agent's order count is
+                # derived from assignments, so there is no counter column to write back
+                DeliveryAssignment.objects.update_or_create(
                     order=order,
                     defaults={
-                        'delivery_agent': agent,
+                        'agent': agent,
                         'status': 'assigned',
                         'assigned_at': timezone.now(),
                     }
                 )
                 
-                if not created:
-                    assignment.delivery_agent = agent
-                    assignment.status = 'assigned'
-                    assignment.assigned_at = timezone.now()
-                    assignment.save()
-                
-                # Update agent availability
-                agent.current_orders_count = DeliveryAssignment.objects.filter(
-                    delivery_agent=agent,
-                    status__in=['assigned', 'accepted', 'picked_up']
-                ).count()
-                agent.save()
-                
             except DeliveryAgent.DoesNotExist:
                 return JsonResponse({
                     'success': False, 
@@ -246,17 +236,16 @@ def update_order_status(request):
         return JsonResponse({'success': False, 'message': str(e)})
 
 
-@login_required
-def order_detail(request, order_id):
+@store_owner_required
+def order_detail(request, store, order_id):
     """Detailed order view for store owners"""
     try:
-        store = Store.objects.get(owner=request.user, is_active=True)
         order = Order.objects.select_related(
-            'user', 'delivery_assignment__delivery_agent__user'
+            'user', 'delivery_assignment__agent__user'
         ).prefetch_related(
-            'items__store_product__product'
+            Prefetch('items', queryset=OrderItem.objects.select_related('store_product__product__category'))
         ).get(id=order_id, store=store)
-    except (Store.DoesNotExist, Order.DoesNotExist):
+    except Order.DoesNotExist:
         return redirect('stores:dashboard')
     
     # Available delivery agents
@@ -276,14 +265,9 @@ def order_detail(request, order_id):
     return render(request, 'stores/order_detail.html', context)
 
 
-@login_required
-def inventory_management(request):
+@store_owner_required
+def inventory_management(request, store):
     """Store inventory management"""
-    try:
-        store = Store.objects.get(owner=request.user, is_active=True)
-    except Store.DoesNotExist:
-        return redirect('core:home')
-    
     # Filter parameters
     category_filter = request.GET.get('category', '')
     stock_filter = request.GET.get('stock', '')
@@ -292,7 +276,7 @@ def inventory_management(request):
     # Base queryset
     products = StoreProduct.objects.filter(store=store).select_related(
         'product', 'product__category'
-    )
+    ).only(*INVENTORY_LIST_FIELDS)
     
     # Apply filters
     if category_filter:
@@ -335,15 +319,10 @@ def inventory_management(request):
     return render(request, 'stores/inventory_management.html', context)
 
 
-@login_required
+@store_owner_required(ajax=True)
 @require_POST
-def update_stock(request):
+def update_stock(request, store):
     """Update product stock quantity"""
-    try:
-        store = Store.objects.get(owner=request.user, is_active=True)
-    except Store.DoesNotExist:
-        return JsonResponse({'success': False, 'message': 'Access denied'})
-    
     product_id = request.POST.get('product_id')
     new_quantity = request.POST.get('quantity')
     
@@ -352,19 +331,35 @@ def update_stock(request):
         if new_quantity < 0:
             return JsonResponse({'success': False, 'message': 'Quantity cannot be negative'})
         
-        store_product = StoreProduct.objects.get(id=product_id, store=store)
+        # Narrow read for the response and the sync service below
+        store_product = StoreProduct.objects.filter(id=product_id, store=store).select_related(
+            'product'
+        ).only('id', 'stock_quantity', 'is_available', 'product__id', 'product__name').first()
+        if store_product is None:
+            return JsonResponse({'success': False, 'message': 'Product not found'})
         old_quantity = store_product.stock_quantity
         
-        store_product.stock_quantity = new_quantity
-        store_product.last_stock_update = timezone.now()
+        # Auto-disable if out of stock, re-enable when restocked from zero; decided by
+        # the UPDATE from the row's current values so a concurrent change is not overwritten
+        if new_quantity == 0:
+            is_available = Value(False)
+        else:
+            is_available = Case(When(stock_quantity=0, then=Value(True)), default=F('is_available'))
+        updated = StoreProduct.objects.filter(id=store_product.id, store=store).update(
+            stock_quantity=new_quantity,
+            is_available=is_available,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            return JsonResponse({'success': False, 'message': 'Product not found'})
+        # update() bypasses StoreProduct.save(), so drop the store's cached counts here
+        StoreProduct.clear_store_caches(store.id)
         
-        # Auto-disable if out of stock
         if new_quantity == 0:
             store_product.is_available = False
-        elif old_quantity == 0 and new_quantity > 0:
+        elif old_quantity == 0:
             store_product.is_available = True
-        
-        store_product.save()
+        store_product.stock_quantity = new_quantity
         
         # Use the inventory sync service if available
         try:
@@ -388,25 +383,18 @@ def update_stock(request):
         
     except ValueError:
         return JsonResponse({'success': False, 'message': 'Invalid quantity value'})
-    except StoreProduct.DoesNotExist:
-        return JsonResponse({'success': False, 'message': 'Product not found'})
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)})
 
 
-@login_required
-def delivery_agents_management(request):
+@store_owner_required
+def delivery_agents_management(request, store):
     """Manage delivery agents for the store"""
-    try:
-        store = Store.objects.get(owner=request.user, is_active=True)
-    except Store.DoesNotExist:
-        return redirect('core:home')
-    
     agents = DeliveryAgent.objects.filter(store=store).select_related(
         'user'
     ).annotate(
-        active_orders=Count('assignments', 
-                          filter=Q(assignments__status__in=['assigned', 'accepted', 'picked_up']))
+        active_orders=Count('assigned_orders', 
+                          filter=Q(assigned_orders__status__in=['assigned', 'accepted', 'picked_up']))
     ).order_by('user__first_name')
     
     context = {
@@ -417,31 +405,27 @@ def delivery_agents_management(request):
     return render(request, 'stores/agents_management.html', context)
 
 
-@login_required
+@store_owner_required(ajax=True)
 @csrf_exempt
-def get_new_orders_count(request):
+def get_new_orders_count(request, store):
     """AJAX endpoint to get new orders count for real-time updates"""
-    try:
-        store = Store.objects.get(owner=request.user, is_active=True)
-        new_orders_count = Order.objects.filter(
-            store=store,
-            status='pending',
-            created_at__gte=timezone.now() - timedelta(minutes=5)
-        ).count()
-        
-        pending_orders_count = Order.objects.filter(
-            store=store,
-            status__in=['pending', 'confirmed']
-        ).count()
-        
-        return JsonResponse({
-            'success': True,
-            'new_orders': new_orders_count,
-            'pending_orders': pending_orders_count,
-            'timestamp': timezone.now().isoformat()
-        })
-    except Store.DoesNotExist:
-        return JsonResponse({'success': False, 'message': 'Access denied'})
+    new_orders_count = Order.objects.filter(
+        store=store,
+        status='pending',
+        created_at__gte=timezone.now() - timedelta(minutes=5)
+    ).count()
+    
+    pending_orders_count = Order.objects.filter(
+        store=store,
+        status__in=['pending', 'confirmed']
+    ).count()
+    
+    return JsonResponse({
+        'success': True,
+        'new_orders': new_orders_count,
+        'pending_orders': pending_orders_count,
+        'timestamp': timezone.now().isoformat()
+    })
 
 
 # Auto-assignment logic for delivery agents
@@ -454,28 +438,20 @@ def auto_assign_delivery_agent(order):
             is_available=True,
             user__is_active=True
         ).annotate(
-            active_orders_count=Count('assignments', 
-                                    filter=Q(assignments__status__in=['assigned', 'accepted', 'picked_up']))
+            active_orders_count=Count('assigned_orders', 
+                                    filter=Q(assigned_orders__status__in=['assigned', 'accepted', 'picked_up']))
         ).order_by('active_orders_count', 'id')  # Assign to agent with least active orders
         
-        if available_agents.exists():
-            best_agent = available_agents.first()
-            
-            # Create delivery assignment
-            assignment = DeliveryAssignment.objects.create(
+        best_agent = available_agents.first()
+        if best_agent is not None:
+            # Create delivery assignment; the agent's order count is derived from
+            # assignments, so there is no counter column to write back
+            return DeliveryAssignment.objects.create(
                 order=order,
-                delivery_agent=best_agent,
+                agent=best_agent,
                 status='assigned',
                 assigned_at=timezone.now()
             )
-            
-            # Update agent's current order count
-            best_agent.current_orders_count = available_agents.filter(
-                id=best_agent.id
-            ).first().active_orders_count + 1
-            best_agent.save()
-            
-            return assignment
         
     except Exception as e:
         pass  # Silently handle errors